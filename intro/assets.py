@@ -0,0 +1,283 @@
+import hashlib
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pygame
+
+CACHE_VERSION = 1 # Bump when the cache layout or the way images are prepared changes
+
+def resolve_path(root, *parts):
+    # Absolute path of root/parts. A part that does not exist with that exact case is matched
+    # case-insensitively, so "Intro" and "intro" both work on case-sensitive file systems
+    path = root
+    for part in parts:
+        candidate = os.path.join(path, part)
+        if not os.path.exists(candidate) and os.path.isdir(path):
+            lowered = part.lower()
+            for name in os.listdir(path):
+                if name.lower() == lowered:
+                    candidate = os.path.join(path, name)
+                    break
+        path = candidate
+    return path
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+# An image read by AssetManager.load_image, waiting for finish_image on the main thread
+class PreparedImage:
+    def __init__(self, parts, size, alpha):
+        self.parts = parts
+        self.size = size
+        self.alpha = alpha
+        self.cache_path = None
+        self.mapped = None # (mmap, offset, size) on a cache hit
+        self.surface = None # Decoded and scaled, not yet converted, on a miss
+        self.seconds = 0.0
+
+# Loads the game's images ready to blit: decoded, scaled and converted to the display format.
+# Each prepared image is also written to cache_dir as raw pixels, named after the source file's
+# hash, the target size and the pixel format, so the next start maps those bytes straight
+# back with pygame.image.frombuffer instead of decoding and scaling again. Editing an image
+# changes its hash, so stale entries are simply never looked up. Every load is timed for report().
+class AssetManager:
+    def __init__(self, root, cache_dir=None, use_cache=True):
+        self.root = root
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(root, "__assetcache__")
+        self.use_cache = use_cache
+        self.timings = [] # (name, seconds, how it was loaded)
+        self._paths = {}
+
+    def path(self, *parts):
+        # Resolved once per distinct path
+        path = self._paths.get(parts)
+        if path is None:
+            path = self._paths[parts] = resolve_path(self.root, *parts)
+        return path
+
+    def image(self, *parts, size=None, alpha=False):
+        # Surface for the image at root/parts, scaled to size if given. alpha=True keeps per-pixel
+        # alpha (convert_alpha), otherwise it is converted to the opaque display format
+        return self.finish_image(self.load_image(parts, size, alpha))
+
+    def load_image(self, parts, size=None, alpha=False):
+        # The slow half of image(), safe on a worker thread: map the cached pixels, or decode
+        # and scale the file. finish_image() must then be called on the main thread
+        start = time.perf_counter()
+        prepared = PreparedImage(parts, size, alpha)
+        path = self.path(*parts)
+        prepared.cache_path = self._cache_path(path, size, alpha) if self.use_cache else None
+        if prepared.cache_path is not None:
+            prepared.mapped = self._map_cache(prepared.cache_path, size)
+        if prepared.mapped is None:
+            surface = pygame.image.load(path)
+            if size is not None and surface.get_size() != tuple(size):
+                surface = pygame.transform.scale(surface, size)
+            prepared.surface = surface
+        prepared.seconds = time.perf_counter() - start
+        return prepared
+
+    def finish_image(self, prepared):
+        # The main thread half: convert to the display format, and fill the cache after a miss
+        start = time.perf_counter()
+        convert = "convert_alpha" if prepared.alpha else "convert"
+        if prepared.mapped is not None:
+            data, offset, size = prepared.mapped
+            pixels = pygame.image.frombuffer(memoryview(data)[offset:], size, "RGBA" if prepared.alpha else "RGBX")
+            surface = getattr(pixels, convert)()
+            del pixels # Release the mapping before it is closed
+            data.close()
+            how = "cache"
+        else:
+            surface = getattr(prepared.surface, convert)()
+            if prepared.cache_path is not None:
+                self._write_cache(prepared.cache_path, surface, prepared.alpha, store_size=prepared.size is None)
+            how = "decoded"
+        self.timings.append(("/".join(prepared.parts), prepared.seconds + time.perf_counter() - start, how))
+        return surface
+
+    def timed(self, name, load, *args):
+        # Run any other loader (sounds, fonts, derived images) and time it for the report
+        start = time.perf_counter()
+        result = load(*args)
+        self.timings.append((name, time.perf_counter() - start, "loaded"))
+        return result
+
+    def total_seconds(self):
+        return sum(seconds for _, seconds, _ in self.timings)
+
+    def report(self):
+        # Startup timings as a printable table, slowest first
+        lines = [f"{'asset':<36}{'ms':>8}  source"]
+        for name, seconds, how in sorted(self.timings, key=lambda timing: -timing[1]):
+            lines.append(f"{name:<36}{seconds * 1000:>8.2f}  {how}")
+        lines.append(f"{'total':<36}{self.total_seconds() * 1000:>8.2f}")
+        return "\n".join(lines)
+
+    def clear_cache(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".raw"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _cache_path(self, path, size, alpha):
+        try:
+            digest = file_digest(path)
+        except OSError:
+            return None # Let pygame.image.load report the missing file
+        width, height = size if size is not None else ("src", "src")
+        name = f"{os.path.basename(path)}-{digest[:20]}-{width}x{height}-{'rgba' if alpha else 'rgbx'}-v{CACHE_VERSION}.raw"
+        return os.path.join(self.cache_dir, name)
+
+    def _map_cache(self, cache_path, size):
+        # (mapping, offset, size) of cached pixels, or None on a miss. Unscaled entries do not
+        # know their size from the name, so they store it in front of the pixels
+        try:
+            with open(cache_path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        offset = 0
+        if size is None:
+            size = (int.from_bytes(data[0:4], "little"), int.from_bytes(data[4:8], "little"))
+            offset = 8
+        if len(data) != offset + size[0] * size[1] * 4:
+            data.close()
+            return None
+        return data, offset, size
+
+    def _write_cache(self, cache_path, surface, alpha, store_size=False):
+        # Best effort: a read-only install just runs without the cache
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            header = b""
+            if store_size:
+                width, height = surface.get_size()
+                header = width.to_bytes(4, "little") + height.to_bytes(4, "little")
+            temporary = cache_path + ".tmp"
+            with open(temporary, "wb") as out:
+                out.write(header)
+                out.write(pygame.image.tobytes(surface, "RGBA" if alpha else "RGBX"))
+            os.replace(temporary, cache_path)
+        except OSError:
+            pass
+
+# One thing for an AssetLoader to load: an image (to AssetManager.image's size and alpha) or a
+# sound. Critical requests are the ones the game cannot start without
+class AssetRequest:
+    def __init__(self, name, kind, parts, size=None, alpha=False, critical=False):
+        self.name = name
+        self.kind = kind # "image" or "sound"
+        self.parts = parts
+        self.size = size
+        self.alpha = alpha
+        self.critical = critical
+
+# Loads AssetRequests on a pool of worker threads so the window can show a loading screen,
+# and the game can start, while files are still being read. Workers do the slow part (reading
+# the pixel cache, decoding and scaling images, decoding sounds); poll() on the main thread
+# finishes each one that is done (convert() needs the display) and passes it to
+# on_ready(request, value). Critical requests are queued first. load_all() does the same work
+# in order on the calling thread, for tests and headless runs.
+class AssetLoader:
+    def __init__(self, manager, requests, on_ready, workers=4):
+        self.manager = manager
+        self.requests = sorted(requests, key=lambda request: not request.critical) # Stable: otherwise in the given order
+        self.on_ready = on_ready
+        self.workers = workers
+        self.finished = set() # Names handed to on_ready
+        self._pending = [] # (request, future) still to finish
+        self._pool = None
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="assets")
+        self._pending = [(request, self._pool.submit(self._load, request)) for request in self.requests]
+
+    def load_all(self):
+        for request in self.requests:
+            self._finish(request, self._load(request))
+
+    def poll(self):
+        # Finish whatever the workers are done with; returns the names finished by this call
+        # One done() call per future: one that finishes mid-poll is either finished now or next time
+        done = []
+        pending = []
+        for entry in self._pending:
+            (done if entry[1].done() else pending).append(entry)
+        if not done:
+            return []
+        self._pending = pending
+        for request, future in done:
+            self._finish(request, future.result()) # Re-raises a worker's error here
+        if not self._pending:
+            self.close()
+        return [request.name for request, _ in done]
+
+    def wait_any(self, timeout=None):
+        # Sleep until a worker finishes another request, or timeout seconds pass
+        if self._pending:
+            wait([future for _, future in self._pending], timeout, FIRST_COMPLETED)
+
+    def wait(self, name):
+        # Block until the named request is finished
+        while name not in self.finished and self._pending:
+            self.wait_any()
+            self.poll()
+
+    def progress(self):
+        return len(self.finished), len(self.requests)
+
+    @property
+    def critical_ready(self):
+        return all(request.name in self.finished for request in self.requests if request.critical)
+
+    @property
+    def done(self):
+        return len(self.finished) == len(self.requests)
+
+    def close(self):
+        # Stop the workers; anything not started yet is dropped
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _load(self, request):
+        # Worker side. Images stop short of convert(); sounds are complete
+        if request.kind == "image":
+            return self.manager.load_image(request.parts, request.size, request.alpha)
+        return self.manager.timed("/".join(request.parts), pygame.mixer.Sound, self.manager.path(*request.parts))
+
+    def _finish(self, request, value):
+        if request.kind == "image":
+            value = self.manager.finish_image(value)
+        self.finished.add(request.name)
+        self.on_ready(request, value)
+
+def startup_report(root, headless=True):
+    # Load every game asset twice, first with an empty cache (the cold start) then from the cache
+    from mainfile import Assets
+    report = {}
+    manager = AssetManager(root)
+    manager.clear_cache()
+    Assets(headless, manager)
+    report["cold"] = manager
+    manager = AssetManager(root)
+    Assets(headless, manager)
+    report["cached"] = manager
+    return report
+
+if __name__ == "__main__":
+    # python assets.py: startup timings without and with the pixel cache
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from mainfile import ASSET_DIR, init_display
+    init_display(headless=True)
+    root = sys.argv[1] if len(sys.argv) > 1 else ASSET_DIR
+    for mode, manager in startup_report(root, headless=False).items():
+        print(f"== {mode} ==")
+        print(manager.report())
@@ -0,0 +1,267 @@
+import os
+import random
+import re
+import sys
+import time
+
+import pygame
+
+# Soundtrack files are named soundtrack<number>.mp3
+TRACK_PATTERN = re.compile(r"soundtrack(\d+)\.mp3$")
+
+def discover_tracks(folder):
+    # Map soundtrack number -> path for every track actually present in the folder
+    tracks = {}
+    for name in os.listdir(folder):
+        match = TRACK_PATTERN.match(name)
+        if match:
+            tracks[int(match.group(1))] = os.path.join(folder, name)
+    return dict(sorted(tracks.items()))
+
+# Background music streamed from disk through pygame.mixer.music.
+# Only the playing track is open, and it is decoded a chunk at a time while it plays, so
+# startup no longer waits for every soundtrack to be decoded into RAM. Switching tracks
+# opens the new file on demand. crossfade_to() ramps the old track down over a few frames
+# from update(), then fades the new one in, so the game loop never blocks on a fade.
+class Music:
+    def __init__(self, tracks, volume=0.60, backend=None):
+        self._tracks = tracks # {number: path}
+        self._volume = volume
+        self._music = backend if backend is not None else pygame.mixer.music
+        self.current = None # Number of the track playing
+        self._next = None # Track waiting for the fade out to finish
+        self._fade_ms = 0
+        self._fade_start = 0
+
+    def numbers(self):
+        return list(self._tracks)
+
+    def play(self, number, fade_ms=0):
+        # Start streaming a track on a loop
+        self._music.load(self._tracks[number])
+        self._music.set_volume(self._volume)
+        self._music.play(-1, fade_ms=fade_ms) # -1 means loop forever
+        self.current = number
+        self._next = None
+        print(f"Current soundtrack: Soundtrack {number}")
+
+    def play_random(self, rng=random):
+        # Start a randomly chosen track, like the game always has
+        self.play(rng.choice(self.numbers()))
+
+    def next_number(self):
+        # Number of the track after the current one, wrapping around
+        numbers = self.numbers()
+        if self.current not in numbers:
+            return numbers[0]
+        return numbers[(numbers.index(self.current) + 1) % len(numbers)]
+
+    def crossfade_to(self, number, fade_ms=2000, now_ms=None):
+        # Fade the current track out over half of fade_ms, then fade `number` in over the other half
+        if self.current is None:
+            self.play(number, fade_ms // 2)
+            return
+        self._next = number
+        self._fade_ms = max(1, fade_ms // 2)
+        self._fade_start = pygame.time.get_ticks() if now_ms is None else now_ms
+
+    def update(self, now_ms=None):
+        # Call once a frame to move any crossfade along
+        if self._next is None:
+            return
+        now_ms = pygame.time.get_ticks() if now_ms is None else now_ms
+        progress = (now_ms - self._fade_start) / self._fade_ms
+        if progress < 1:
+            self._music.set_volume(self._volume * (1 - progress))
+            return
+        self.play(self._next, self._fade_ms)
+
+    def stop(self):
+        self._music.stop()
+        self.current = None
+        self._next = None
+
+# Stand-ins for pygame.mixer and its Channels that make no sound, for headless runs and tests.
+# Channels remember what they were asked to play and count as busy for busy_plays later plays
+# to any channel, so voice stealing can be tested without an audio device
+class SilentChannel:
+    def __init__(self, mixer):
+        self._mixer = mixer
+        self.plays = [] # (sound, volume) per play
+        self.volume = 1.0
+        self._busy_until = 0
+
+    def play(self, sound, *args, **kwargs):
+        self.plays.append((sound, self.volume))
+        self._busy_until = self._mixer.play_count + self._mixer.busy_plays
+        self._mixer.play_count += 1
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_busy(self):
+        return self._mixer.play_count < self._busy_until
+
+    def stop(self):
+        self._busy_until = 0
+
+class SilentMixer:
+    def __init__(self, busy_plays=0):
+        self.busy_plays = busy_plays
+        self.play_count = 0
+        self.num_channels = 8
+        self.reserved = 0
+        self._channels = {}
+
+    def set_num_channels(self, count):
+        self.num_channels = count
+
+    def set_reserved(self, count):
+        self.reserved = count
+
+    def Channel(self, number):
+        channel = self._channels.get(number)
+        if channel is None:
+            channel = self._channels[number] = SilentChannel(self)
+        return channel
+
+# What the game holds instead of a pygame Sound: play() asks the SoundEffects to play it this frame
+class SoundHandle:
+    def __init__(self, effects, name):
+        self._effects = effects
+        self.name = name
+
+    def play(self, *args, **kwargs):
+        self._effects.play(self.name)
+
+    def set_volume(self, volume):
+        self._effects.set_volume(self.name, volume)
+
+# Sound effects mixed through a fixed set of mixer channels. The first `reserved` channels are
+# kept for priority cues (losing a life) so they are never cut off by effects; the music streams
+# through pygame.mixer.music and never takes a channel at all. The other `voices` channels play
+# everything else. play() only counts the request; update(), once a frame, turns each sound's
+# requests into at most one voice: repeats in the same frame are coalesced into one louder play,
+# plays within a sound's min_interval_ms of its last one are dropped, and so is a play that
+# finds every voice busy. Counters show how much was coalesced and dropped.
+class SoundEffects:
+    def __init__(self, voices=8, reserved=1, backend=None):
+        self._mixer = backend if backend is not None else pygame.mixer
+        self._mixer.set_num_channels(reserved + voices)
+        self._mixer.set_reserved(reserved)
+        self._priority = [self._mixer.Channel(number) for number in range(reserved)]
+        self._voices = [self._mixer.Channel(number) for number in range(reserved, reserved + voices)]
+        self._priority_first = self._priority + self._voices # A priority cue can still use a voice
+        self._sounds = {} # name -> [sound, volume, min_interval_ms, priority, max_boost]
+        self._pending = {} # name -> plays requested since the last update
+        self._last_played = {} # name -> ms
+        self.requested = 0
+        self.played = 0
+        self.coalesced = 0 # Requests folded into another play of the same sound in the same frame
+        self.dropped_rate_limited = 0
+        self.dropped_no_voice = 0
+        self.dropped_not_loaded = 0 # Plays of a sound still being loaded
+
+    def add(self, name, sound, volume=1.0, min_interval_ms=0, priority=False, max_boost=3.0):
+        # Register a sound and return its handle. None plays nothing: headless runs never load
+        # sounds, and a streamed-in sound is set later with set_sound
+        if sound is not None:
+            sound.set_volume(1.0) # Loudness is set per play on the channel
+        self._sounds[name] = [sound, volume, min_interval_ms, priority, max_boost]
+        return SoundHandle(self, name)
+
+    def set_sound(self, name, sound):
+        sound.set_volume(1.0)
+        self._sounds[name][0] = sound
+
+    def set_volume(self, name, volume):
+        self._sounds[name][1] = volume
+
+    def play(self, name):
+        self.requested += 1
+        self._pending[name] = self._pending.get(name, 0) + 1
+
+    def update(self, now_ms=None):
+        # Call once a frame to start this frame's sounds
+        if not self._pending:
+            return
+        now_ms = pygame.time.get_ticks() if now_ms is None else now_ms
+        for name, count in self._pending.items():
+            sound, volume, min_interval_ms, priority, max_boost = self._sounds[name]
+            if sound is None and self._mixer is pygame.mixer:
+                self.dropped_not_loaded += count
+                continue
+            last = self._last_played.get(name)
+            if last is not None and now_ms - last < min_interval_ms:
+                self.dropped_rate_limited += count
+                continue
+            channel = self._free_channel(self._priority_first if priority else self._voices)
+            if channel is None:
+                self.dropped_no_voice += count
+                continue
+            self.coalesced += count - 1
+            # n copies of a sound at once are about sqrt(n) times as loud as one
+            channel.set_volume(min(1.0, volume * min(max_boost, count ** 0.5)))
+            channel.play(sound if sound is not None else name) # Headless sounds are None; the silent channel records the name
+            self._last_played[name] = now_ms
+            self.played += 1
+        self._pending.clear()
+
+    def _free_channel(self, channels):
+        for channel in channels:
+            if not channel.get_busy():
+                return channel
+        return None
+
+    def stats(self):
+        return {
+            "requested": self.requested,
+            "played": self.played,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped_rate_limited + self.dropped_no_voice + self.dropped_not_loaded,
+            "dropped_rate_limited": self.dropped_rate_limited,
+            "dropped_no_voice": self.dropped_no_voice,
+            "dropped_not_loaded": self.dropped_not_loaded,
+        }
+
+def _resident_bytes():
+    # Resident memory of this process, or None where /proc is not available
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _delta(before):
+    after = _resident_bytes()
+    return None if before is None or after is None else after - before
+
+def startup_report(folder):
+    # Compare decoding every soundtrack up front (the old startup) with streaming just one
+    report = {}
+
+    rss = _resident_bytes()
+    start = time.perf_counter()
+    music = Music(discover_tracks(folder))
+    music.play_random()
+    report["streamed"] = {"seconds": time.perf_counter() - start, "rss_delta": _delta(rss)}
+    music.stop()
+
+    rss = _resident_bytes()
+    start = time.perf_counter()
+    sounds = [pygame.mixer.Sound(path) for path in discover_tracks(folder).values()]
+    frequency, _, channels = pygame.mixer.get_init()
+    decoded = sum(int(sound.get_length() * frequency) * channels * 2 for sound in sounds)
+    report["decoded"] = {"seconds": time.perf_counter() - start, "rss_delta": _delta(rss), "pcm_bytes": decoded}
+    return report
+
+if __name__ == "__main__":
+    # python audio.py: print startup time and memory for both ways of loading the soundtrack
+    pygame.mixer.init()
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "soundtrack")
+    for mode, numbers in startup_report(folder).items():
+        rss = numbers["rss_delta"]
+        memory = "n/a" if rss is None else f"{rss / 1e6:.1f} MB"
+        print(f"{mode}: {numbers['seconds'] * 1000:.1f} ms, resident memory +{memory}")
+        if "pcm_bytes" in numbers:
+            print(f"  decoded PCM held in RAM: {numbers['pcm_bytes'] / 1e6:.1f} MB")
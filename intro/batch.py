@@ -0,0 +1,229 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+from mainfile import World, create_world, cSpeed
+from profiler import percentile
+
+# Batch runner for balance and soak testing. Plays many headless sessions in parallel, one
+# process per core, each from its own seed with a computer pilot at the controls, then sums up
+# score, survival time, kills per minute, peak entity counts and simulation speed. Tunables can
+# be swept: every combination of the --set values is played with the same list of seeds.
+#
+#   python batch.py --sessions 200 --set enemy_spawn_delay=20,40,80 --set missile_delay=120,480
+
+DEFAULT_MAX_TICKS = 60 * 60 * cSpeed # An hour of game time
+
+# Tunables a sweep can change, and how each one is applied to a fresh World
+TUNABLES = {
+    "enemy_spawn_delay": lambda world, value: setattr(world, "enemy_spawn_delay", value),
+    "explosion_time": lambda world, value: setattr(world, "explosion_time", value),
+    "missile_homing_speed": lambda world, value: setattr(world, "missile_homing_speed", value),
+    "missile_delay": lambda world, value: setattr(world.player, "_missile_delay", value),
+}
+
+### Pilots ###
+# A pilot is made from a random.Random and returns keys(world, tick) -> held keys for World.step
+
+DIRECTIONS = [None, pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
+
+def random_pilot(rng):
+    # Holds a random direction for a random while, and fire about half the time
+    state = {"direction": None, "until": 0, "fire": False}
+    def keys(world, tick):
+        if tick >= state["until"]:
+            state["direction"] = rng.choice(DIRECTIONS)
+            state["fire"] = rng.random() < 0.5
+            state["until"] = tick + rng.randint(5, 60)
+        held = {pygame.K_SPACE: state["fire"]}
+        if state["direction"] is not None:
+            held[state["direction"]] = True
+        return held
+    return keys
+
+def weave_pilot(rng):
+    # Sweeps left and right along the bottom with the fire key held
+    period = rng.randint(30, 90)
+    def keys(world, tick):
+        return {pygame.K_SPACE: True, (pygame.K_LEFT if (tick // period) % 2 else pygame.K_RIGHT): True}
+    return keys
+
+def dodge_pilot(rng):
+    # Steps sideways away from the closest enemy bullet coming down on it, otherwise follows
+    # the lowest enemy, always firing
+    def keys(world, tick):
+        player = world.player
+        px = player.getXPos() + player._sprite.get_width() // 2
+        py = player.getYPos()
+        threat = None
+        for ebullet in world.enemyBullets:
+            if ebullet.getYPos() < py and py - ebullet.getYPos() < 120 and abs(ebullet.getXPos() - px) < 24:
+                if threat is None or ebullet.getYPos() > threat.getYPos():
+                    threat = ebullet
+        if threat is not None:
+            return {pygame.K_SPACE: True, (pygame.K_RIGHT if threat.getXPos() <= px else pygame.K_LEFT): True}
+        if world.enemies:
+            target = max(world.enemies, key=lambda enemy: enemy.getYPos())
+            tx = target.getXPos() + target._sprite.get_width() // 2
+            if abs(tx - px) > player._speed:
+                return {pygame.K_SPACE: True, (pygame.K_RIGHT if tx > px else pygame.K_LEFT): True}
+        return {pygame.K_SPACE: True}
+    return keys
+
+PILOTS = {"random": random_pilot, "weave": weave_pilot, "dodge": dodge_pilot}
+
+### Sessions ###
+
+_worker = None # (surface, assets) made once per worker process
+
+def _worker_setup():
+    global _worker
+    surface, assets, _ = create_world(headless=True)
+    _worker = (surface, assets)
+
+def run_session(job):
+    # Play one session to game over or max_ticks. job is a dict with seed, pilot, max_ticks and
+    # tunables; returns the job's seed and tunables with the session's results
+    if _worker is None:
+        _worker_setup()
+    surface, assets = _worker
+    random.seed(job["seed"])
+    world = World(surface, assets, broadphase=True)
+    for name, value in job["tunables"].items():
+        TUNABLES[name](world, value)
+    pilot = PILOTS[job["pilot"]](random.Random(job["seed"] ^ 0x5EED))
+    peaks = dict.fromkeys(world.entity_counts(), 0)
+    start = time.perf_counter()
+    for tick in range(job["max_ticks"]):
+        world.step(pilot(world, tick))
+        for name, count in world.entity_counts().items():
+            if count > peaks[name]:
+                peaks[name] = count
+        if world.game_over:
+            break
+    seconds = time.perf_counter() - start
+    world.close() # This worker plays many sessions with one projectile pool
+    minutes = world.ticks / cSpeed / 60
+    return {
+        "seed": job["seed"],
+        "tunables": job["tunables"],
+        "worker": os.getpid(),
+        "ticks": world.ticks,
+        "survived": not world.game_over,
+        "score": world.score,
+        "kills_per_minute": world.score / minutes if minutes else 0.0,
+        "peaks": peaks,
+        "seconds": seconds,
+        "ticks_per_second": world.ticks / seconds if seconds else 0.0,
+    }
+
+def make_jobs(sessions, sweep=None, pilot="random", max_ticks=DEFAULT_MAX_TICKS, seed=0):
+    # One job per (tunable combination, seed). Every combination gets the same seeds, so they
+    # are compared on the same enemy waves
+    sweep = sweep or {}
+    names = list(sweep)
+    jobs = []
+    for values in itertools.product(*(sweep[name] for name in names)):
+        tunables = dict(zip(names, values))
+        for number in range(sessions):
+            jobs.append({"seed": seed + number, "pilot": pilot, "max_ticks": max_ticks, "tunables": tunables})
+    return jobs
+
+def run_batch(jobs, workers=None):
+    # Run jobs across a process pool (or in this process with workers=1), results in job order
+    if workers == 1:
+        return [run_session(job) for job in jobs]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_setup) as pool:
+        return list(pool.map(run_session, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+def _spread(values):
+    values = sorted(values)
+    return {
+        "mean": sum(values) / len(values) if values else 0.0,
+        "min": values[0] if values else 0,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "max": values[-1] if values else 0,
+    }
+
+def _ticks_per_second(results):
+    seconds = sum(result["seconds"] for result in results)
+    return sum(result["ticks"] for result in results) / seconds if seconds else 0.0
+
+def summarise(results):
+    # Aggregate results per tunable combination: {combination key: summary}
+    groups = {}
+    for result in results:
+        key = json.dumps(result["tunables"], sort_keys=True)
+        groups.setdefault(key, []).append(result)
+    summaries = {}
+    for key, group in groups.items():
+        workers = {}
+        for result in group:
+            workers.setdefault(result["worker"], []).append(result)
+        summaries[key] = {
+            "tunables": group[0]["tunables"],
+            "sessions": len(group),
+            "survival_rate": sum(result["survived"] for result in group) / len(group),
+            "score": _spread([result["score"] for result in group]),
+            "survival_seconds": _spread([result["ticks"] / cSpeed for result in group]),
+            "kills_per_minute": _spread([result["kills_per_minute"] for result in group]),
+            "peaks": {name: max(result["peaks"][name] for result in group) for name in group[0]["peaks"]},
+            "ticks_per_second": {worker: _ticks_per_second(runs) for worker, runs in workers.items()},
+        }
+    return summaries
+
+def format_summary(summaries):
+    lines = []
+    for summary in summaries.values():
+        tunables = " ".join(f"{name}={value}" for name, value in summary["tunables"].items()) or "defaults"
+        score = summary["score"]
+        survival = summary["survival_seconds"]
+        speeds = summary["ticks_per_second"].values()
+        lines.append(f"{tunables}: {summary['sessions']} sessions, {summary['survival_rate']:.0%} survived")
+        lines.append(f"    score mean {score['mean']:.1f} p50 {score['p50']} p90 {score['p90']} max {score['max']}")
+        lines.append(f"    survival mean {survival['mean']:.1f}s p50 {survival['p50']:.1f}s, kills/min {summary['kills_per_minute']['mean']:.2f}")
+        lines.append("    peaks " + " ".join(f"{name}:{count}" for name, count in summary["peaks"].items()))
+        lines.append(f"    {len(speeds)} workers, {min(speeds):.0f}-{max(speeds):.0f} ticks/s each")
+    return "\n".join(lines)
+
+def parse_set(text):
+    # "name=1,2,3" -> ("name", [1, 2, 3])
+    name, _, values = text.partition("=")
+    if name not in TUNABLES or not values:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(TUNABLES)} as name=value[,value...]")
+    return name, [float(value) if "." in value else int(value) for value in values.split(",")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many headless Desert Storm sessions in parallel")
+    parser.add_argument("--sessions", type=int, default=100, help="sessions per tunable combination")
+    parser.add_argument("--pilot", choices=list(PILOTS), default="random")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS, help="stop a session that survives this long")
+    parser.add_argument("--seed", type=int, default=0, help="first seed; sessions use seed, seed+1, ...")
+    parser.add_argument("--set", dest="sweep", action="append", type=parse_set, default=[], metavar="NAME=V1,V2",
+                        help=f"sweep a tunable ({', '.join(TUNABLES)}); repeat for more")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: one per core)")
+    parser.add_argument("--json", metavar="PATH", help="also write every session result and the summaries")
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args.sessions, dict(args.sweep), args.pilot, args.max_ticks, args.seed)
+    start = time.perf_counter()
+    results = run_batch(jobs, args.workers)
+    summaries = summarise(results)
+    print(format_summary(summaries))
+    print(f"{len(jobs)} sessions in {time.perf_counter() - start:.1f}s")
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"results": results, "summaries": list(summaries.values())}, out, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import pygame
+
+from mainfile import World, Renderer, Player, Projectile, Enemy, create_world, screenWidth, screenHeight, projectile_pool_size, explosion_capacity
+from effects import EffectBuffer
+from masks import MaskCache
+from pool import ObjectPool
+from profiler import FrameProfiler
+from scheduler import Scheduler
+from spatial import SpatialHash
+
+# Deterministic headless benchmarks. Every scenario runs from a fixed random seed with scripted
+# input, so two runs on the same machine simulate exactly the same game. Results can be saved as
+# a JSON baseline and later runs fail when a scenario gets slower (or hungrier) than the baseline
+# by more than the threshold percentage.
+#
+#   python benchmark.py --save-baseline bench.json
+#   python benchmark.py --baseline bench.json --threshold 10
+
+DEFAULT_TICKS = 2000
+DEFAULT_SEED = 1234
+DEFAULT_THRESHOLD = 10.0 # Percent
+ALLOCATION_TICKS = 300 # Ticks traced with tracemalloc (slow, so kept short)
+
+def weave(tick):
+    # Fly left and right across the screen with the fire key held
+    return {pygame.K_SPACE: True, (pygame.K_LEFT if (tick // 40) % 2 else pygame.K_RIGHT): True}
+
+def idle_flight(world, assets):
+    # No input at all: the cost of a quiet game
+    return lambda tick: {}
+
+def dense_waves(world, assets):
+    # An enemy every other tick while the player weaves and fires
+    world.enemy_spawn_delay = 2
+    return weave
+
+def bullet_storm(world, assets):
+    # Thirty enemy bullets rain from the top and thirty player bullets rise from the bottom every tick,
+    # a few thousand projectiles on screen at once
+    surface = world._surface
+    def tick(number):
+        for _ in range(30):
+            world.enemyBullets.append(Projectile.spawn(surface, assets.enemyBulletSprite, random.randint(0, screenWidth - 4), 0, "down"))
+            world.bullets.append(Projectile.spawn(surface, assets.playerBulletSprite, random.randint(0, screenWidth - 4), screenHeight - 8))
+        return weave(number)
+    return tick
+
+def missile_spam(world, assets):
+    # A missile every tick plus five more from random spots, all homing on frequent enemies
+    world.enemy_spawn_delay = 4
+    world.player._missile_delay = 1
+    surface = world._surface
+    def tick(number):
+        for _ in range(5):
+            world.missiles.append(Projectile.spawn(surface, assets.playerMissileSprite, random.randint(0, screenWidth - 6), screenHeight - 12))
+        return weave(number)
+    return tick
+
+SCENARIOS = {
+    "idle_flight": idle_flight,
+    "dense_waves": dense_waves,
+    "bullet_storm": bullet_storm,
+    "missile_spam": missile_spam,
+}
+
+def _play(name, surface, assets, ticks, seed, render, entity_store, profiler=None):
+    # Build a fresh world for the scenario and run it; returns the world
+    random.seed(seed)
+    Projectile.pool = ObjectPool(lambda: Projectile(None, None, 0, 0), capacity=projectile_pool_size) # Start every run from an empty pool
+    if entity_store:
+        from entity_store import ArrayWorld
+        world = ArrayWorld(surface, assets)
+    else:
+        world = World(surface, assets)
+    if profiler is not None:
+        world.profiler = profiler
+    world.player.lives = 10 ** 9 # Never game over, so every run lasts the full tick count
+    script = SCENARIOS[name](world, assets)
+    renderer = Renderer(surface, assets) if render else None
+    mark = world.profiler.mark
+    for number in range(ticks):
+        world.profiler.begin_frame()
+        keys = script(number)
+        mark("script")
+        world.step(keys)
+        if renderer is not None:
+            renderer.draw(world)
+            mark("draw")
+        world.profiler.end_frame()
+    return world
+
+def run_scenario(name, surface, assets, ticks=DEFAULT_TICKS, seed=DEFAULT_SEED, render=True, entity_store=False):
+    # Time one scenario, then replay its start under tracemalloc for allocation figures
+    profiler = FrameProfiler(enabled=True, window=ticks)
+    collections = gc.get_stats()[0]["collections"]
+    start = time.perf_counter()
+    world = _play(name, surface, assets, ticks, seed, render, entity_store, profiler)
+    seconds = time.perf_counter() - start
+    collections = gc.get_stats()[0]["collections"] - collections
+
+    tracemalloc.start()
+    _play(name, surface, assets, min(ticks, ALLOCATION_TICKS), seed, render, entity_store).close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    world.close()
+    return {
+        "ticks": ticks,
+        "seconds": seconds,
+        "ticks_per_second": ticks / seconds,
+        "phases_ms": {phase: stats["mean"] for phase, stats in profiler.summary().items()},
+        "gc_gen0_collections": collections, # Rough measure of container allocation churn
+        "peak_kb": peak / 1024,
+        "score": world.score,
+        "entities": world.entity_counts(),
+    }
+
+def run_all(names=None, ticks=DEFAULT_TICKS, seed=DEFAULT_SEED, render=True, entity_store=False):
+    surface, assets, _ = create_world(headless=True)
+    saved_pool = Projectile.pool
+    try:
+        return {name: run_scenario(name, surface, assets, ticks, seed, render, entity_store) for name in (names or SCENARIOS)}
+    finally:
+        Projectile.pool = saved_pool
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Messages for every scenario that regressed past threshold percent; empty when all is well
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slowest = base["ticks_per_second"] * (1 - threshold / 100)
+        if result["ticks_per_second"] < slowest:
+            failures.append(f"{name}: {result['ticks_per_second']:.0f} ticks/s, baseline {base['ticks_per_second']:.0f} (-{threshold}% allowed)")
+        largest = base["peak_kb"] * (1 + threshold / 100)
+        if result["peak_kb"] > largest:
+            failures.append(f"{name}: peak {result['peak_kb']:.0f} KB, baseline {base['peak_kb']:.0f} KB (+{threshold}% allowed)")
+    return failures
+
+def format_results(results):
+    lines = []
+    for name, result in results.items():
+        lines.append(f"{name}: {result['ticks_per_second']:.0f} ticks/s, peak {result['peak_kb']:.0f} KB, "
+                     f"{result['gc_gen0_collections']} gen0 collections, score {result['score']}")
+        slowest = sorted(result["phases_ms"].items(), key=lambda item: -item[1])
+        lines.append("    " + ", ".join(f"{phase} {ms:.3f}ms" for phase, ms in slowest))
+    return "\n".join(lines)
+
+### Entity microbenchmark ###
+
+# GameObject as it was before __slots__: a __dict__ per object and a new Rect per get_rect().
+# With a direction it has the old Projectile's attributes
+class DictObject:
+    def __init__(self, surface, sprite, xPos, yPos, speed, direction=None):
+        self._surface = surface
+        self._sprite = sprite
+        self._xPos = xPos
+        self._yPos = yPos
+        self._speed = speed
+        self._prevX = xPos
+        self._prevY = yPos
+        if direction is not None:
+            self._direction = direction
+
+    def get_rect(self):
+        return pygame.Rect(self._xPos, self._yPos, self._sprite.get_width(), self._sprite.get_height())
+
+# (enemy, bullet) factories for each layout, called with (sprite, x, y)
+LAYOUTS = {
+    "dict": (lambda sprite, x, y: DictObject(None, sprite, x, y, 3), lambda sprite, x, y: DictObject(None, sprite, x, y, 10, "up")),
+    "slots": (lambda sprite, x, y: Enemy(None, sprite, x, y), lambda sprite, x, y: Projectile(None, sprite, x, y)),
+}
+
+def _bytes_per_entity(make, sprite, count):
+    gc.collect()
+    tracemalloc.start()
+    objects = [None] * count
+    before = tracemalloc.get_traced_memory()[0]
+    for number in range(count):
+        objects[number] = make(sprite, number % screenWidth, number % screenHeight)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+def _per_second(work, operations, repeat):
+    # Best of `repeat` runs, as operations per second
+    best = min(_seconds(work) for _ in range(repeat))
+    return operations / best if best else 0.0
+
+def _seconds(work):
+    start = time.perf_counter()
+    work()
+    return time.perf_counter() - start
+
+def entity_microbenchmark(count=1000, pairs=(50, 200), repeat=5):
+    # Memory per entity, get_rect() calls per second over `count` entities, and collision tests
+    # per second for every enemy against every bullet (pairs = (enemies, bullets)) the way
+    # Enemy.handle_collisions does them, for the old dict layout and the slotted one
+    sprite = pygame.Surface((26, 36))
+    bullet_sprite = pygame.Surface((5, 10))
+    results = {}
+    for layout, (make_enemy, make_bullet) in LAYOUTS.items():
+        entities = [make_bullet(bullet_sprite, number % screenWidth, number % screenHeight) for number in range(count)]
+        enemies = [make_enemy(sprite, number * 7 % screenWidth, number * 13 % screenHeight) for number in range(pairs[0])]
+        bullets = [make_bullet(bullet_sprite, number * 3 % screenWidth, number * 5 % screenHeight) for number in range(pairs[1])]
+
+        def rects():
+            for entity in entities:
+                entity.get_rect()
+
+        def collisions():
+            for enemy in enemies:
+                enemy_rect = enemy.get_rect()
+                for bullet in bullets:
+                    bullet.get_rect().colliderect(enemy_rect)
+
+        results[layout] = {
+            "bytes_per_entity": _bytes_per_entity(make_bullet, bullet_sprite, count),
+            "get_rect_per_second": _per_second(rects, count, repeat),
+            "pair_tests_per_second": _per_second(collisions, pairs[0] * pairs[1], repeat),
+        }
+    return results
+
+def format_microbenchmark(results):
+    lines = []
+    for layout, result in results.items():
+        lines.append(f"{layout}: {result['bytes_per_entity']:.0f} bytes/entity, {result['get_rect_per_second'] / 1e6:.2f}M get_rect/s, "
+                     f"{result['pair_tests_per_second'] / 1e6:.2f}M pair tests/s")
+    return "\n".join(lines)
+
+### Collision narrowphase benchmark ###
+
+def _enemy_collisions(surface, assets, rng, enemies, bullets, masks):
+    # Every enemy against a crowd of player bullets, the way World.step does it with the grid on.
+    # Returns (seconds, hits)
+    enemy_list = [Enemy(surface, assets.enemySprite, rng.randrange(screenWidth - 26), rng.randrange(screenHeight // 2)) for _ in range(enemies)]
+    bullet_list = [Projectile(surface, assets.playerBulletSprite, rng.randrange(screenWidth), rng.randrange(screenHeight // 2 + 40)) for _ in range(bullets)]
+    grid = SpatialHash(screenWidth, screenHeight)
+    grid.insert_all("bullets", bullet_list)
+    explosions = EffectBuffer(Scheduler(), assets.explosionFrames, explosion_capacity)
+    score_ref = [0]
+    start = time.perf_counter()
+    for enemy in enemy_list[:]:
+        enemy.handle_collisions(enemy_list, [], bullet_list, assets.explosionSprite, explosions, 30, assets.explosionSound, score_ref, grid, masks)
+    return time.perf_counter() - start, score_ref[0]
+
+def _player_collisions(surface, assets, rng, hazards, masks):
+    # The player, in each of its sprites, against enemy bullets crowded around it. Returns (seconds, hits)
+    sprites = (assets.playerMovingForwardSprite, assets.playerMovingLeftSprite, assets.playerMovingRightSprite)
+    player = Player(surface, *sprites, screenWidth // 2, screenHeight // 2, scheduler=Scheduler())
+    player.lives = 10 ** 9
+    explosions = EffectBuffer(Scheduler(), assets.explosionFrames, explosion_capacity)
+    seconds = 0.0
+    hits = 0
+    for sprite in sprites:
+        player.set_sprite(sprite)
+        player._xPos, player._yPos = screenWidth // 2, screenHeight // 2
+        hazard_list = [Projectile(surface, assets.enemyBulletSprite, screenWidth // 2 + rng.randint(-30, 30), screenHeight // 2 + rng.randint(-40, 40), "down")
+                       for _ in range(hazards)]
+        start = time.perf_counter()
+        player.handle_collisions([], hazard_list, explosions, assets.explosionSprite, 30, assets.explosionSound, None, masks)
+        seconds += time.perf_counter() - start
+        hits += hazards - len(hazard_list)
+    return seconds, hits
+
+def collision_benchmark(enemies=200, bullets=2000, hazards=300, repeat=5, seed=DEFAULT_SEED):
+    # Enemy.handle_collisions and Player.handle_collisions on crowded scenes, rect-only and with
+    # the mask narrowphase. Each mode sees the same scenes; times are the best of `repeat`
+    surface, assets, _ = create_world(headless=True)
+    results = {}
+    for mode in ("rects", "masks"):
+        masks = MaskCache.for_assets(assets) if mode == "masks" else None
+        enemy_runs = [_enemy_collisions(surface, assets, random.Random(seed + run), enemies, bullets, masks) for run in range(repeat)]
+        player_runs = [_player_collisions(surface, assets, random.Random(seed + run), hazards, masks) for run in range(repeat)]
+        results[mode] = {
+            "enemy_ms": min(seconds for seconds, _ in enemy_runs) * 1000,
+            "enemy_hits": enemy_runs[0][1],
+            "player_ms": min(seconds for seconds, _ in player_runs) * 1000,
+            "player_hits": player_runs[0][1],
+            "mask_tests": masks.tests // repeat if masks is not None else 0,
+        }
+    return results
+
+def format_collisions(results):
+    lines = []
+    for mode, result in results.items():
+        lines.append(f"{mode}: enemies {result['enemy_ms']:.2f} ms ({result['enemy_hits']} hits), "
+                     f"player {result['player_ms']:.2f} ms ({result['player_hits']} hits), {result['mask_tests']} mask tests per run")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Desert Storm benchmarks")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="run only this scenario (repeatable)")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--no-render", action="store_true", help="skip drawing, simulation only")
+    parser.add_argument("--entity-store", action="store_true", help="benchmark the NumPy ArrayWorld")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="fail if slower than this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression in percent")
+    parser.add_argument("--entities", type=int, metavar="N",
+                        help="instead of the scenarios, compare memory and get_rect/collision speed of N entities in the old dict and the slotted layout")
+    parser.add_argument("--collisions", type=int, metavar="N",
+                        help="instead of the scenarios, time rect-only against pixel-perfect collisions for N enemies among 10*N bullets")
+    args = parser.parse_args(argv)
+
+    if args.collisions:
+        print(format_collisions(collision_benchmark(args.collisions, args.collisions * 10, seed=args.seed)))
+        return 0
+    if args.entities:
+        print(format_microbenchmark(entity_microbenchmark(args.entities)))
+        return 0
+
+    results = run_all(args.scenario, args.ticks, args.seed, not args.no_render, args.entity_store)
+    print(format_results(results))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as out:
+            json.dump(results, out, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.threshold)
+        for failure in failures:
+            print("REGRESSION", failure)
+        return 1 if failures else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
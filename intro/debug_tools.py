@@ -1,12 +1,96 @@
 import pygame
+from spatial import SpatialHash
 
+# Debug overlay, toggled in game with H. Create it once and call draw(world) after the scene
+# every frame: while it is off that returns straight away, so it can stay in the loop.
+# When on it outlines every hitbox, and can also show the broadphase grid cells in use,
+# the enemy/projectile candidate pairs it produces (yellow, white when they really overlap)
+# and per-frame entity and collision-test counts.
 class HitboxDebugger:
-    def __init__(self, surface, colour=(255, 0, 0), width=1):
+    def __init__(self, surface, colour=(255, 0, 0), width=1, show_broadphase=True, show_counts=True):
         self.surface = surface
         self.colour = colour  # Red by default
         self.width = width    # Line thickness
+        self.enabled = False
+        self.show_broadphase = show_broadphase
+        self.show_counts = show_counts
+        self.grid_colour = (40, 80, 160)
+        self.pair_colour = (255, 255, 0)
+        self.hit_colour = (255, 255, 255)
+        self._font = None
+        self._grid = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
 
     def draw_hitbox(self, game_object):
         # Draw the rect border of the given game object
-        rect = game_object.get_rect()
-        pygame.draw.rect(self.surface, self.colour, rect, self.width)
\ No newline at end of file
+        self.draw_rect(game_object.get_rect())
+
+    def draw_rect(self, rect):
+        # Draw the border of a rect that is already known
+        pygame.draw.rect(self.surface, self.colour, rect, self.width)
+
+    def draw_rects(self, rects, colour=None):
+        # Draw many rect borders with the surface locked once for the whole batch
+        colour = self.colour if colour is None else colour
+        surface = self.surface
+        width = self.width
+        draw_rect = pygame.draw.rect
+        surface.lock()
+        try:
+            for rect in rects:
+                draw_rect(surface, colour, rect, width)
+        finally:
+            surface.unlock()
+
+    def draw(self, world):
+        # Draw the overlay for this frame; does nothing while the overlay is off
+        if not self.enabled:
+            return
+        if self.show_broadphase:
+            self.draw_broadphase(world.collision_rects())
+        self.draw_rects(world.hitboxes())
+        if self.show_counts:
+            self.draw_counts(world)
+
+    def draw_broadphase(self, groups):
+        # Grid cells holding projectiles, and the enemy/projectile pairs that reach the narrowphase
+        if self._grid is None:
+            width, height = self.surface.get_size()
+            self._grid = SpatialHash(width, height)
+        grid = self._grid
+        grid.clear()
+        for name in ("missiles", "bullets"):
+            for rect in groups[name]:
+                grid.insert(name, rect, rect)
+
+        cell_size = grid.cell_size
+        cells = [pygame.Rect(col * cell_size, row * cell_size, cell_size, cell_size) for row, col in grid.occupied_cells()]
+        self.draw_rects(cells, self.grid_colour)
+
+        surface = self.surface
+        surface.lock()
+        try:
+            for enemy_rect in groups["enemies"]:
+                for name in ("missiles", "bullets"):
+                    for rect in grid.query(name, enemy_rect):
+                        colour = self.hit_colour if rect.colliderect(enemy_rect) else self.pair_colour
+                        pygame.draw.line(surface, colour, enemy_rect.center, rect.center)
+        finally:
+            surface.unlock()
+
+    def draw_counts(self, world):
+        # Entity and collision-test counts for the last tick, bottom left of the screen
+        if self._font is None:
+            self._font = pygame.font.Font(None, 18)
+        counts = world.entity_counts()
+        lines = [
+            " ".join(f"{name}:{count}" for name, count in counts.items()),
+            f"collision tests:{world.collision_tests}",
+        ]
+        y = self.surface.get_height() - 5
+        for line in reversed(lines):
+            text = self._font.render(line, True, self.hit_colour)
+            y -= text.get_height()
+            self.surface.blit(text, (5, y))
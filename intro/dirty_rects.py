@@ -0,0 +1,67 @@
+import pygame
+
+# Dirty-rectangle presentation: instead of pushing the whole screen every frame, only the
+# rects sprites covered last frame (now uncovered) and this frame are sent to display.update.
+# The background scrolls in whole tile rows of `scroll_step` pixels, so on most frames it does
+# not move at all and the uncovered areas are restored from a cached backdrop. Frames where the
+# background does move, or where the dirty area is over max_dirty_fraction of the screen, fall
+# back to a full update.
+class DirtyRects:
+    def __init__(self, background, screen_size, scroll_step=8, max_dirty_fraction=0.5):
+        self._background = background
+        self._backdrop = pygame.Surface(screen_size).convert() # Background at the current offset
+        self._screen_area = screen_size[0] * screen_size[1]
+        self.scroll_step = scroll_step
+        self.max_dirty_fraction = max_dirty_fraction
+        self._offset = None # Background offset the backdrop was drawn at
+        self._previous = [] # Sprite rects from last frame
+        self._dirty = []
+        self._full = True # Next present() must push the whole screen
+        self.full_updates = 0
+        self.partial_updates = 0
+        self.last_dirty_area = 0
+
+    def background_items(self, bg_offset):
+        # What to draw on the background layer this frame
+        offset = int(bg_offset) // self.scroll_step * self.scroll_step
+        if offset != self._offset:
+            # Background moved a tile row: redraw the backdrop and the whole screen
+            height = self._background.get_height()
+            self._backdrop.blit(self._background, (0, offset - height))
+            self._backdrop.blit(self._background, (0, offset))
+            self._offset = offset
+            self._full = True
+            return [(self._backdrop, (0, 0))]
+        # Background still: only paint it back where sprites were last frame
+        return [(self._backdrop, rect, rect) for rect in self._previous]
+
+    def frame_drawn(self, sprite_rects):
+        # Record what this frame drew above the background
+        current = [rect for rect in sprite_rects if rect.width and rect.height]
+        self._dirty = self._previous + current
+        self._previous = current
+
+    def invalidate(self):
+        # Force a full redraw and update next frame (e.g. after drawing the endcard)
+        self._offset = None
+        self._full = True
+
+    def set_background(self, background):
+        # Swap in a new background image (a placeholder replaced once the real one has loaded)
+        self._background = background
+        self.invalidate()
+
+    def present(self):
+        # Push this frame to the display, partially when that is worth it
+        area = sum(rect.width * rect.height for rect in self._dirty)
+        self.last_dirty_area = area
+        if self._full or area > self._screen_area * self.max_dirty_fraction:
+            pygame.display.update()
+            self.full_updates += 1
+        else:
+            pygame.display.update(self._dirty)
+            self.partial_updates += 1
+        self._full = False
+
+    def stats(self):
+        return {"full_updates": self.full_updates, "partial_updates": self.partial_updates, "last_dirty_area": self.last_dirty_area}
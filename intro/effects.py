@@ -0,0 +1,96 @@
+import pygame
+
+def explosion_frames(image, size=32, count=8, grow=(0.6, 1.3), fade=(255, 40)):
+    # Pre-render an explosion animation from one image: it grows from grow[0] to grow[1] times
+    # `size` while its alpha falls from fade[0] to fade[1]. Every frame is scaled and converted
+    # once here, so drawing an effect is a plain blit. Returns [(surface, (dx, dy)), ...] where
+    # the offset centres the frame on a size x size footprint
+    frames = []
+    for index in range(count):
+        t = index / (count - 1) if count > 1 else 0.0
+        side = max(1, round(size * (grow[0] + (grow[1] - grow[0]) * t)))
+        frame = pygame.transform.smoothscale(image, (side, side)).convert_alpha()
+        alpha = round(fade[0] + (fade[1] - fade[0]) * t)
+        if alpha < 255:
+            frame.fill((255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+        offset = (size - side) // 2
+        frames.append((frame, (offset, offset)))
+    return frames
+
+# Live effects in a fixed-capacity ring buffer. Each effect is a position, the scheduler time it
+# started and the time it ends; one scheduler event per effect retires it from the oldest end,
+# so nothing is scanned or shifted per frame. When the buffer is full the oldest effect is
+# overwritten (counted in `dropped`), so a chain of kills can never grow it.
+# append([x, y, time]) keeps spawn_explosion_at_object working unchanged.
+class EffectBuffer:
+    def __init__(self, scheduler, frames, capacity=64):
+        self._scheduler = scheduler
+        self._frames = frames
+        self.capacity = capacity
+        self._x = [0] * capacity
+        self._y = [0] * capacity
+        self._start = [0.0] * capacity
+        self._end = [0.0] * capacity
+        self._head = 0 # Slot of the oldest live effect
+        self._count = 0
+        self.dropped = 0 # Effects overwritten while still live
+
+    def add(self, x, y, lifetime):
+        capacity = self.capacity
+        if self._count == capacity:
+            self._head = (self._head + 1) % capacity
+            self._count -= 1
+            self.dropped += 1
+        slot = (self._head + self._count) % capacity
+        now = self._scheduler.now
+        self._x[slot] = x
+        self._y[slot] = y
+        self._start[slot] = now
+        self._end[slot] = now + lifetime
+        self._count += 1
+        self._scheduler.schedule(lifetime, self._retire)
+
+    def append(self, entry):
+        # [x, y, time] as built by spawn_explosion_at_object
+        self.add(entry[0], entry[1], entry[2])
+
+    def _retire(self):
+        # Drop every effect from the oldest end that has run its time. Lifetimes only differ if
+        # explosion_time changed mid-game; then a short effect may wait for an older long one
+        now = self._scheduler.now
+        capacity = self.capacity
+        end = self._end
+        while self._count and end[self._head] <= now:
+            self._head = (self._head + 1) % capacity
+            self._count -= 1
+
+    def _slots(self):
+        head = self._head
+        capacity = self.capacity
+        return [(head + i) % capacity for i in range(self._count)]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        # (x, y, end) for every live effect, oldest first
+        for slot in self._slots():
+            yield (self._x[slot], self._y[slot], self._end[slot])
+
+    def blit_sequence(self, alpha=None):
+        # (frame, position) pairs for one Surface.blits call, each effect on the frame for its age.
+        # Effects never move, so the Renderer's interpolation alpha changes nothing
+        frames = self._frames
+        last = len(frames) - 1
+        now = self._scheduler.now
+        xs, ys, starts, ends = self._x, self._y, self._start, self._end
+        items = []
+        for slot in self._slots():
+            start = starts[slot]
+            progress = (now - start) / (ends[slot] - start) if ends[slot] > start else 1.0
+            frame, (dx, dy) = frames[min(last, int(progress * (last + 1)))]
+            items.append((frame, (xs[slot] + dx, ys[slot] + dy)))
+        return items
+
+    def stats(self):
+        return {"live": self._count, "capacity": self.capacity, "dropped": self.dropped}
@@ -0,0 +1,280 @@
+import math
+import random
+from itertools import repeat
+
+import numpy as np
+import pygame
+
+from mainfile import (World, bullet_width, bullet_height, enemyBullet_width, missile_width, missile_height,
+                      screenHeight)
+
+# Direction strings used by Projectile mapped to the sign of their y movement
+DIRECTIONS = {"up": -1, "down": 1}
+
+# Struct-of-arrays storage for one kind of entity (bullets, missiles, enemies...) that all share a sprite.
+# Rows 0..count-1 are in use and stay in the order they were added, like the lists they replace.
+class EntityStore:
+    def __init__(self, sprite, capacity=256):
+        self._sprite = sprite
+        self.width = sprite.get_width() # All rows share one sprite so one size
+        self.height = sprite.get_height()
+        self.count = 0 # Number of rows in use
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self.direction = np.zeros(capacity, dtype=np.int8) # -1 up, 1 down
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.prev_x = np.zeros(capacity, dtype=np.float64) # Positions before the last tick, for drawing between ticks
+        self.prev_y = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, extra):
+        # Double the arrays until another `extra` rows fit
+        capacity = len(self.x)
+        needed = self.count + extra
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("x", "y", "speed", "direction", "alive", "prev_x", "prev_y"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, x, y, speed, direction):
+        # Add one row at the end
+        self._reserve(1)
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.speed[i] = speed
+        self.direction[i] = direction
+        self.alive[i] = True
+        self.count += 1
+
+    def add_many(self, xs, ys, speed, direction):
+        # Add a batch of rows that share speed and direction
+        n = len(xs)
+        if n == 0:
+            return
+        self._reserve(n)
+        rows = slice(self.count, self.count + n)
+        self.x[rows] = self.prev_x[rows] = xs
+        self.y[rows] = self.prev_y[rows] = ys
+        self.speed[rows] = speed
+        self.direction[rows] = direction
+        self.alive[rows] = True
+        self.count += n
+
+    def append(self, obj):
+        # Copy a GameObject into the store, so code written for lists (Player.shoot...) can add to it.
+        # The object itself is no longer needed, so a pooled one goes straight back to its pool
+        self.add(obj._xPos, obj._yPos, obj._speed, DIRECTIONS.get(getattr(obj, "_direction", "down"), 1))
+        obj.free()
+
+    def move(self):
+        # Move every row by its speed in its direction
+        n = self.count
+        self.y[:n] += self.speed[:n] * self.direction[:n]
+
+    def cull(self, top, bottom):
+        # Mark rows dead once they are at or above `top` or below `bottom`
+        n = self.count
+        y = self.y[:n]
+        self.alive[:n] &= (y > top) & (y <= bottom)
+
+    def kill(self, rows):
+        # Mark the given row index or array of indices dead
+        self.alive[rows] = False
+
+    def compact(self):
+        # Drop dead rows, keeping the live ones in order
+        n = self.count
+        keep = np.flatnonzero(self.alive[:n])
+        m = len(keep)
+        if m == n:
+            return
+        for arr in (self.x, self.y, self.speed, self.direction, self.prev_x, self.prev_y):
+            arr[:m] = arr[keep]
+        self.alive[:m] = True
+        self.alive[m:n] = False
+        self.count = m
+
+    def update(self, top, bottom):
+        # Move, cull and compact in one pass
+        self.move()
+        self.cull(top, bottom)
+        self.compact()
+
+    def overlapping(self, rect):
+        # Indices of live rows whose rect overlaps `rect` (same rule as Rect.colliderect)
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        hit = self.alive[:n] & (x < rect.right) & (x + self.width > rect.left) & (y < rect.bottom) & (y + self.height > rect.top)
+        return np.flatnonzero(hit)
+
+    def remember_positions(self):
+        # Note every row's position before a tick moves it
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def positions(self, alpha=None):
+        # (x, y) of every row, ready to hand to pygame. With alpha (0-1), that far from the
+        # position before the last tick to the current one
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        if alpha is not None:
+            prev_x = self.prev_x[:n]
+            prev_y = self.prev_y[:n]
+            x = prev_x + (x - prev_x) * alpha
+            y = prev_y + (y - prev_y) * alpha
+        return list(zip(x.tolist(), y.tolist()))
+
+    def blit_sequence(self, alpha=None):
+        # (sprite, position) pairs for Surface.blits
+        return zip(repeat(self._sprite, self.count), self.positions(alpha))
+
+    def rects(self):
+        # A pygame.Rect per row (only used for debugging, collisions use overlapping)
+        return [pygame.Rect(x, y, self.width, self.height) for x, y in self.positions()]
+
+# World that keeps projectiles and enemies in EntityStores and updates each kind in one vectorized pass.
+# Gameplay rules match World; only enemy shooting draws from its own (seeded) numpy generator.
+class ArrayWorld(World):
+    def __init__(self, surface, assets):
+        super().__init__(surface, assets)
+        self.bullets = EntityStore(assets.playerBulletSprite)
+        self.missiles = EntityStore(assets.playerMissileSprite)
+        self.enemies = EntityStore(assets.enemySprite)
+        self.enemyBullets = EntityStore(assets.enemyBulletSprite)
+        self._rng = np.random.default_rng(random.getrandbits(32))
+
+    def step(self, keys):
+        assets = self._assets
+        player = self.player
+
+        mark = self.profiler.mark
+        if self.interpolate:
+            self.remember_positions()
+        self.scheduler.advance()
+        mark("timers")
+        # Every collision check is vectorized over whole stores, count the pairs they cover
+        self.collision_tests = len(self.enemies) + len(self.enemyBullets)
+        player.Movement(keys)
+        mark("movement")
+        self.player_collisions()
+        mark("player_collisions")
+        player.shoot(keys, self.bullets, assets.playerBulletSprite, bullet_width, assets.gunshotSound)
+        player.shoot_missile(keys, self.missiles, assets.playerMissileSprite, missile_width, missile_height, assets.missileSound)
+        mark("shooting")
+
+        self.scroll_background()
+
+        # Player bullets leave at the top, enemy bullets at the bottom
+        self.bullets.update(-bullet_height, math.inf)
+        mark("bullets")
+        self.update_missiles()
+        mark("missile_homing")
+        self.spawn_enemies()
+        self.enemyBullets.update(-math.inf, screenHeight)
+        self.collision_tests += len(self.enemies) * (len(self.missiles) + len(self.bullets))
+        self.update_enemies()
+        mark("enemies")
+
+        self.ticks += 1
+        if player.is_dead():
+            self.game_over = True
+
+    def close(self):
+        # Nothing to give back: append() returns pooled projectiles as soon as it has copied them
+        pass
+
+    def explode_at(self, x, y, width, height):
+        # Same placement as spawn_explosion_at_object, for a row instead of an object
+        explosionSprite = self._assets.explosionSprite
+        explosion_x = int(x) + width // 2 - explosionSprite.get_width() // 2
+        explosion_y = int(y) + height // 2 - explosionSprite.get_height() // 2
+        self.explosions.append([explosion_x, explosion_y, self.explosion_time])
+        self._assets.explosionSound.play()
+
+    def player_collisions(self):
+        # Vectorized Player.handle_collisions: every enemy or enemy bullet touching the player hurts it once
+        assets = self._assets
+        player_rect = self.player.get_rect()
+        for store, damage in ((self.enemies, -3), (self.enemyBullets, -1)):
+            hits = store.overlapping(player_rect)
+            if len(hits) == 0:
+                continue
+            store.kill(hits)
+            store.compact()
+            for _ in hits:
+                self.player.update_health(damage, self.explosions, assets.explosionSprite, self.explosion_time, assets.explosionSound)
+
+    def update_missiles(self):
+        # Move and cull missiles, then steer each one towards its closest enemy if that enemy is above it
+        missiles = self.missiles
+        missiles.update(-missile_height, math.inf)
+        enemies = self.enemies
+        m = missiles.count
+        e = enemies.count
+        if m == 0 or e == 0:
+            return
+        missile_cx = missiles.x[:m] + missile_width // 2
+        missile_cy = missiles.y[:m] + missile_height // 2
+        enemy_cx = enemies.x[:e] + enemies.width // 2
+        enemy_cy = enemies.y[:e] + enemies.height // 2
+        dx = enemy_cx[None, :] - missile_cx[:, None]
+        dy = enemy_cy[None, :] - missile_cy[:, None]
+        closest = np.argmin(np.hypot(dx, dy), axis=1)
+        steer = np.clip(dx[np.arange(m), closest], -self.missile_homing_speed, self.missile_homing_speed)
+        above = enemies.y[:e][closest] < missiles.y[:m]
+        missiles.x[:m] += np.where(above, steer, 0)
+
+    def update_enemies(self):
+        # Move every enemy, let some shoot, then resolve hits from missiles (first) and bullets
+        enemies = self.enemies
+        enemies.move()
+        n = enemies.count
+        if n == 0:
+            return
+
+        shooters = np.flatnonzero(self._rng.random(n) < 0.02)
+        if len(shooters):
+            self.enemyBullets.add_many(
+                enemies.x[shooters] + enemies.width // 2 - enemyBullet_width // 2,
+                enemies.y[shooters] + enemies.height,
+                10, DIRECTIONS["down"])
+
+        if self.missiles.count or self.bullets.count:
+            for i in range(n):
+                enemy_rect = pygame.Rect(enemies.x[i], enemies.y[i], enemies.width, enemies.height)
+                for store in (self.missiles, self.bullets):
+                    hits = store.overlapping(enemy_rect)
+                    if len(hits):
+                        store.kill(hits[0])
+                        self.explode_at(enemies.x[i], enemies.y[i], enemies.width, enemies.height)
+                        enemies.kill(i)
+                        self.score += 1
+                        break
+            self.missiles.compact()
+            self.bullets.compact()
+
+        # Remove enemies that moved off the bottom of the screen
+        enemies.alive[:n] &= enemies.y[:n] <= screenHeight
+        enemies.compact()
+
+    def hitboxes(self):
+        rects = [self.player.get_rect()]
+        for store in (self.bullets, self.missiles, self.enemies, self.enemyBullets):
+            rects.extend(store.rects())
+        return rects
+
+    def collision_rects(self):
+        groups = {"missiles": self.missiles, "bullets": self.bullets, "enemies": self.enemies, "enemyBullets": self.enemyBullets}
+        return {name: store.rects() for name, store in groups.items()}
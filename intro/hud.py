@@ -0,0 +1,72 @@
+import pygame
+
+# Characters pre-rendered into the glyph atlas
+ATLAS_CHARACTERS = "0123456789-"
+
+# Heads-up display (lives, health, score) that only rasterises text when a value changes.
+# Each label keeps its last value and surface; drawing an unchanged label is just a blit.
+# With use_glyph_atlas the numbers are put together from pre-rendered digit glyphs, so even a
+# changed value costs no font.render call.
+class Hud:
+    def __init__(self, font, colour=(255, 255, 255), use_glyph_atlas=False):
+        self._font = font
+        self._colour = colour
+        self._cache = {} # label -> (value, surface)
+        self._prefixes = {} # label -> rendered "Label: " (atlas mode only)
+        self._glyphs = None
+        self.render_calls = 0 # font.render calls made
+        self.cache_hits = 0 # labels drawn from cache
+        if use_glyph_atlas:
+            self._glyphs = {char: self._render(char) for char in ATLAS_CHARACTERS}
+
+    def _render(self, text):
+        self.render_calls += 1
+        return self._font.render(text, True, self._colour)
+
+    def _compose(self, label, value):
+        # Build "Label: value" from the cached prefix and digit glyphs
+        prefix = self._prefixes.get(label)
+        if prefix is None:
+            prefix = self._prefixes[label] = self._render(f"{label}: ")
+        glyphs = [self._glyphs[char] for char in str(value)]
+        width = prefix.get_width() + sum(glyph.get_width() for glyph in glyphs)
+        height = max([prefix.get_height()] + [glyph.get_height() for glyph in glyphs])
+        text = pygame.Surface((width, height), pygame.SRCALPHA)
+        text.blit(prefix, (0, 0))
+        x = prefix.get_width()
+        for glyph in glyphs:
+            text.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        return text
+
+    def text(self, label, value):
+        # Surface showing "label: value", re-rendered only when value differs from last time
+        cached = self._cache.get(label)
+        if cached is not None and cached[0] == value:
+            self.cache_hits += 1
+            return cached[1]
+        if self._glyphs is not None and isinstance(value, int):
+            text = self._compose(label, value)
+        else:
+            text = self._render(f"{label}: {value}")
+        self._cache[label] = (value, text)
+        return text
+
+    def items(self, lives, health, score):
+        # (surface, position) pairs: lives, then health and score stacked under it, top left of the screen
+        lives_text = self.text("Lives", lives)
+        health_text = self.text("Health", health)
+        score_text = self.text("Score", score)
+        return [
+            (lives_text, (5, 5)),
+            (health_text, (5, 5 + lives_text.get_height() + 5)),
+            (score_text, (5, 5 + lives_text.get_height() + health_text.get_height() + 10)),
+        ]
+
+    def draw(self, surface, lives, health, score):
+        # Draw the HUD straight onto a surface
+        surface.blits(self.items(lives, health, score), doreturn=False)
+
+    def stats(self):
+        # Render calls versus cache hits since the HUD was created
+        return {"render_calls": self.render_calls, "cache_hits": self.cache_hits}
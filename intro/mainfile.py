@@ -1,19 +1,94 @@
+import argparse
+import os
 import pygame
 import random
-import math
+import time
 from debug_tools import HitboxDebugger
+from spatial import SpatialHash, TargetIndex
+from pool import ObjectPool
+from profiler import FrameProfiler, NULL_PROFILER
+from hud import Hud
+from dirty_rects import DirtyRects
+from render_queue import RenderQueue, LAYER_BACKGROUND, LAYER_PLAYER_SHOTS, LAYER_ENEMIES, LAYER_ENEMY_SHOTS, LAYER_EFFECTS, LAYER_PLAYER, LAYER_HUD
+from timestep import FixedTimestep
+from audio import Music, SoundEffects, SilentMixer, discover_tracks
+from assets import AssetLoader, AssetManager, AssetRequest, resolve_path
+from memory import AllocationTracer, GcPolicy
+from masks import MaskCache
+from scheduler import Scheduler
+from effects import EffectBuffer, explosion_frames
 
 ### Global variables and Classes ###
 
+# Set up the display window (320x480 pixels)
+screenWidth = 320
+screenHeight = 480
+cSpeed = 60  # Simulation ticks per second; every speed in the game is per tick
+render_rate = 60 # Frames drawn per second by default (0 draws as fast as possible)
+max_catch_up = 5 # Most ticks run in one frame before the game slows down instead
+title = "desertstorm"
+
+# Define bullet and missile sprite sizes
+bullet_width, bullet_height = 4, 8
+missile_width, missile_height = 6, 12
+enemyBullet_width, enemyBullet_height = 4, 8
+
+# Game tunables
+explosion_time = 30 # Frames an explosion lasts
+missile_homing_speed = 8 # Max speed for missile homing
+enemy_spawn_delay = 40 # Frames between enemy spawns
+enemy_spawn_rate = 1.3 # Spawn countdown progress per frame, so a spawn comes every 31 frames at the default delay
+broadphase_min_pairs = 2000 # Below this many possible collision pairs a plain loop beats building the grid
+projectile_pool_size = 512 # Projectiles kept for reuse before the pool's overflow policy applies
+explosion_capacity = 64 # Most explosions on screen at once; the oldest is dropped beyond that
+
+# Folder holding this file, so assets load no matter where the game is started from
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def asset_path(*parts):
+    # Build an absolute path to a file inside the game folder, whatever the case of its folders
+    return resolve_path(ASSET_DIR, *parts)
+
+def key_down(keys, *codes):
+    # True if any of the key codes is held. Works with pygame.key.get_pressed() and with a plain dict of held keys
+    for code in codes:
+        try:
+            if keys[code]:
+                return True
+        except (KeyError, IndexError):
+            pass
+    return False
+
 # Base class for all objects that appear in the game (player, enemy, projectile, etc.)
 class GameObject:
+    # Slots instead of a per-object __dict__: entities are smaller and their attributes quicker to
+    # reach. Subclasses list their own. The sprite's size is cached in _width/_height (set_sprite
+    # keeps it in step) and each object keeps one Rect that get_rect() moves in place
+    __slots__ = ("_surface", "_sprite", "_width", "_height", "_xPos", "_yPos", "_speed", "_prevX", "_prevY", "_rect", "_pool", "_in_pool")
+
+    def __new__(cls, *args, **kwargs):
+        # Set once per object here rather than in __init__, which ObjectPool reruns on reuse
+        obj = super().__new__(cls)
+        obj._pool = None # ObjectPool this object came from (see pool.py), None if built directly
+        obj._in_pool = False # True while it sits unused in that pool
+        obj._rect = pygame.Rect(0, 0, 0, 0)
+        return obj
+
     # Initialise the object with its drawing surface, image, position, and speed
     def __init__(self, surface, sprite, xPos, yPos, speed):
         self._surface = surface # pygame Surface to draw on
-        self._sprite = sprite # pygame Surface for the sprite image
+        self.set_sprite(sprite) # pygame Surface for the sprite image
         self._xPos = xPos # X coordinate on screen
         self._yPos = yPos # Y coordinate on screen
         self._speed = speed # Speed to move player
+        self._prevX = xPos # Position before the last tick, for drawing between ticks
+        self._prevY = yPos
+
+    def set_sprite(self, sprite):
+        # Change the sprite image along with the cached size
+        self._sprite = sprite
+        self._width, self._height = sprite.get_size() if sprite is not None else (0, 0)
+        self._rect.size = (self._width, self._height)
 
     def getXPos(self):
         # Return the object's current X position
@@ -31,188 +106,220 @@ class GameObject:
         # Draw the object's sprite image at its current position on the given surface
         self._surface.blit(self._sprite, (self._xPos, self._yPos))
 
-    def get_rect(self):
-        # Get a pygame.Rect representing this object's screen area (used for collisions)
-        return pygame.Rect(self._xPos, self._yPos, self._sprite.get_width(), self._sprite.get_height()) 
+    def remember_position(self):
+        # Note the position before a tick moves the object
+        self._prevX = self._xPos
+        self._prevY = self._yPos
 
-    @staticmethod
-    def Draw(surface):
-        # Draw all game elements, including background, bullets, enemies, explosions, and player HUD info
-        global bg_offset, BG, bullets, missiles, enemies, enemyBullets, explosions, explosionSprite, player, font, score
+    def blit_item(self, alpha=None):
+        # (sprite, position) pair for Surface.blits / the render queue. With alpha (0-1) the
+        # position is that far from where the object was before the last tick to where it is now
+        if alpha is None:
+            return (self._sprite, (self._xPos, self._yPos))
+        x = self._prevX
+        y = self._prevY
+        return (self._sprite, (x + (self._xPos - x) * alpha, y + (self._yPos - y) * alpha))
 
-        # Draw the scrolling background (twice for seamless vertical looping)
-        bg_offset_int = int(bg_offset) 
-        BG_height = BG.get_height()
-        surface.blit(BG, (0, bg_offset_int - BG_height)) 
-        surface.blit(BG, (0, bg_offset_int)) 
-
-        # Draw all player bullets
-        for bullet in bullets:
-            bullet.drawSprite()
-        # Draw all player missiles
-        for missile in missiles:
-            missile.drawSprite()
-        # Draw all enemies
-        for enemy in enemies:
-            enemy.drawSprite()
-        # Draw all enemy bullets
-        for ebullet in enemyBullets:
-            ebullet.drawSprite()
-        # Draw all explosions
-        for exp in explosions:
-            surface.blit(explosionSprite, (exp[0], exp[1]))
-        # Draw player sprite on top of everything
-        player.drawSprite()
-        
-        # Draw player lives count on screen
-        lives_text = font.render(f"Lives: {player._lives}", True, (255, 255, 255))
-        surface.blit(lives_text, (5, 5))
-        # Draw player health just under the lives text
-        health_text = font.render(f"Health: {player._health}", True, (255, 255, 255))
-        surface.blit(health_text, (5, 5 + lives_text.get_height() + 5))
-        # Draw player score just under the health text
-        score_text = font.render(f"Score: {score}", True, (255, 255, 255))
-        surface.blit(score_text, (5, 5 + lives_text.get_height() + health_text.get_height() + 10))
+    def get_rect(self):
+        # Get a pygame.Rect representing this object's screen area (used for collisions). It is the
+        # object's own Rect moved to the current position, so copy it to keep it past the next call
+        rect = self._rect
+        rect.x = self._xPos
+        rect.y = self._yPos
+        return rect
+
+    def free(self):
+        # Call once the object has left the game, so a pooled object can be reused
+        if self._pool is not None:
+            self._pool.release(self)
 
 # Player class inherits from GameObject and represents the player aircraft
 class Player(GameObject):
-    def __init__(self, surface, moving_forward_sprite, moving_left_sprite, moving_right_sprite, xPos, yPos):
+    __slots__ = ("_default_sprite", "_moving_left_sprite", "_moving_right_sprite", "_lose_life_sound", "_health", "_max_health", "_lives",
+                 "_scheduler", "_shoot_delay", "_gun_ready", "_missile_delay", "_missile_ready", "_score", "_last_shoot_key")
+
+    def __init__(self, surface, moving_forward_sprite, moving_left_sprite, moving_right_sprite, xPos, yPos, loseLifeSound=None, scheduler=None):
         # Initialise with sprites for each movement direction and basic player stats
         super().__init__(surface, moving_forward_sprite, xPos, yPos, 5)
         self._default_sprite = moving_forward_sprite # Sprite for forward movement
         self._moving_left_sprite = moving_left_sprite # Sprite for moving left
         self._moving_right_sprite = moving_right_sprite # Sprite for moving right
+        self._lose_life_sound = loseLifeSound # Sound played when a life is lost
         self._health = 3 # Player starting health
         self._max_health = 3 # Max health
         self._lives = 3 # Player lives count
-        self._shoot_timer = 0 # Timer for bullet fire rate
+        # Cooldowns are scheduler events that re-arm the guns, nothing counts down per frame.
+        # The World passes its scheduler in; a Player on its own gets one nobody advances
+        self._scheduler = scheduler if scheduler is not None else Scheduler()
         self._shoot_delay = 8 # Delay (frames) between allowed shots
-        self._missile_cooldown = 0 # Timer for missile fire rate
+        self._gun_ready = False # The gun first fires after one full delay
         self._missile_delay = 480 # Delay (frames) between allowed missile fires
+        self._missile_ready = True
+        self._scheduler.schedule(self._shoot_delay, self._rearm_gun)
         self._score = 0 # Player score
         self._last_shoot_key = False # State for continuous shooting
 
+    @property
+    def health(self):
+        return self._health
+
+    @health.setter
+    def health(self, value):
+        self._health = value
+
+    @property
+    def lives(self):
+        return self._lives
+
+    @lives.setter
+    def lives(self, value):
+        self._lives = value
+
+    def is_dead(self):
+        # True once the player has run out of lives
+        return self._lives <= 0
+
     def Movement(self, keysPressed):
         # Handle player movement and change the sprite depending on direction
         moved_left = False
         moved_right = False
 
         # Move up if up arrow or W pressed
-        if keysPressed[pygame.K_UP] or keysPressed[pygame.K_w]:
+        if key_down(keysPressed, pygame.K_UP, pygame.K_w):
             self._yPos -= self._speed
         # Move down if down arrow or S pressed
-        elif keysPressed[pygame.K_DOWN] or keysPressed[pygame.K_s]:
+        elif key_down(keysPressed, pygame.K_DOWN, pygame.K_s):
             self._yPos += self._speed
         # Move right if right arrow or D pressed, and set sprite accordingly
-        elif keysPressed[pygame.K_RIGHT] or keysPressed[pygame.K_d]:
+        elif key_down(keysPressed, pygame.K_RIGHT, pygame.K_d):
             self._xPos += self._speed
-            moved_right = True 
+            moved_right = True
         # Move left if left arrow or A pressed, and set sprite accordingly
-        elif keysPressed[pygame.K_LEFT] or keysPressed[pygame.K_a]:
+        elif key_down(keysPressed, pygame.K_LEFT, pygame.K_a):
             self._xPos -= self._speed
             moved_left = True
 
         # Clamp position so player stays within screen bounds
-        self._xPos = max(0, min(self._xPos, self._surface.get_width() - self._sprite.get_width()))
-        self._yPos = max(0, min(self._yPos, self._surface.get_height() - self._sprite.get_height()))
+        self._xPos = max(0, min(self._xPos, self._surface.get_width() - self._width))
+        self._yPos = max(0, min(self._yPos, self._surface.get_height() - self._height))
 
         # Select appropriate sprite based on movement direction
         if moved_left:
-            self._sprite = self._moving_left_sprite 
+            sprite = self._moving_left_sprite
         elif moved_right:
-            self._sprite = self._moving_right_sprite
+            sprite = self._moving_right_sprite
         else:
-            self._sprite = self._default_sprite
+            sprite = self._default_sprite
+        if sprite is not self._sprite:
+            self.set_sprite(sprite)
 
     def update_health(self, delta, explosions, explosionSprite, explosion_time, explosionSound):
-        # Change player's health by delta, handle losing lives and game over
+        # Change player's health by delta, handle losing lives. Game over is picked up by the World (see is_dead)
         self._health += delta
-        if self._health <= 0: 
+        if self._health <= 0:
             # Spawn an explosion at the player's position, play sound, and lose a life
             spawn_explosion_at_object(self, explosionSprite, explosions, explosion_time, explosionSound)
-            playerLoseLifeSound.play()
+            if self._lose_life_sound is not None:
+                self._lose_life_sound.play()
             self._lives -= 1
             if self._lives > 0:
                 # Respawn player: restore health and place at bottom center
                 self._health = self._max_health
-                self._xPos = (self._surface.get_width() - self._sprite.get_width()) // 2
-                self._yPos = self._surface.get_height() - self._sprite.get_height()
-            else:
-                # Game over: show endcard, pause, and quit
-                self._surface.blit(endcard, (0, 0))
-                pygame.display.update()
-                pygame.time.delay(5000)
-                print("Game Over")
-                pygame.event.post(pygame.event.Event(pygame.QUIT))
+                self._xPos = (self._surface.get_width() - self._width) // 2
+                self._yPos = self._surface.get_height() - self._height
+                self.remember_position() # Appear there, rather than slide across the screen
+
+    def _rearm_gun(self):
+        self._gun_ready = True
+
+    def _rearm_missile(self):
+        self._missile_ready = True
 
     def shoot(self, keys, bullets, bulletSprite, bullet_width, gunshotSound):
-        # Handle shooting bullets
-        if self._shoot_timer < self._shoot_delay:
-            self._shoot_timer += 1
-        if self._shoot_timer >= self._shoot_delay:
-            bullet_x = self.getXPos() + self._sprite.get_width() // 2 - bullet_width // 2
+        # Handle shooting bullets: fires by itself whenever the gun is ready
+        if self._gun_ready:
+            bullet_x = self.getXPos() + self._width // 2 - bullet_width // 2
             bullet_y = self.getYPos()
-            bullets.append(Projectile(self._surface, bulletSprite, bullet_x, bullet_y))
-            self._shoot_timer = 0
+            bullet = Projectile.spawn(self._surface, bulletSprite, bullet_x, bullet_y)
+            if bullet is not None:
+                bullets.append(bullet)
+            self._gun_ready = False
+            self._scheduler.schedule(self._shoot_delay, self._rearm_gun)
             gunshotSound.play()
 
     def shoot_missile(self, keys, missiles, missileSprite, missile_width, missile_height, missileSound):
         # Handle firing missiles
-        if self._missile_cooldown > 0:
-            self._missile_cooldown -= 1
         # press spacebar and missile will fire. missile has cooldown
-        if keys[pygame.K_SPACE] and self._missile_cooldown == 0:
-            missile_x = self.getXPos() + self._sprite.get_width() // 2 - missile_width // 2
+        if self._missile_ready and key_down(keys, pygame.K_SPACE):
+            missile_x = self.getXPos() + self._width // 2 - missile_width // 2
             missile_y = self.getYPos()
-            missiles.append(Projectile(self._surface, missileSprite, missile_x, missile_y))
-            self._missile_cooldown = self._missile_delay
+            missile = Projectile.spawn(self._surface, missileSprite, missile_x, missile_y)
+            if missile is not None:
+                missiles.append(missile)
+            self._missile_ready = False
+            self._scheduler.schedule(self._missile_delay, self._rearm_missile)
             missileSound.play()
 
-    def handle_collisions(self, enemies, enemyBullets, explosions, explosionSprite, explosion_time, explosionSound):
-        # Handle collisions between player and enemies/bullets
+    def handle_collisions(self, enemies, enemyBullets, explosions, explosionSprite, explosion_time, explosionSound, grid=None, masks=None):
+        # Handle collisions between player and enemies/bullets. With a MaskCache (see masks.py)
+        # overlapping rects only count as a hit if the sprites' solid pixels touch
         player_rect = self.get_rect()
-        # Check collision with enemies
-        for enemy in enemies[:]:
-            if player_rect.colliderect(enemy.get_rect()):
-                enemies.remove(enemy)
-                self.update_health(-3, explosions, explosionSprite, explosion_time, explosionSound)
-        # Check collision with enemy bullets
-        for ebullet in enemyBullets[:]:
-            if player_rect.colliderect(ebullet.get_rect()):
-                enemyBullets.remove(ebullet)
-                self.update_health(-1, explosions, explosionSprite, explosion_time, explosionSound)
+        # Check collision with enemies, then with enemy bullets
+        for group, hazards, damage in (("enemies", enemies, -3), ("enemyBullets", enemyBullets, -1)):
+            # With a broadphase grid (see spatial.py) only nearby objects are tested, otherwise all of them
+            candidates = grid.query(group, player_rect) if grid is not None else hazards[:]
+            for hazard in candidates:
+                hazard_rect = hazard.get_rect()
+                if player_rect.colliderect(hazard_rect) and (masks is None or masks.overlap(self, player_rect, hazard, hazard_rect)):
+                    hazards.remove(hazard)
+                    hazard.free()
+                    self.update_health(damage, explosions, explosionSprite, explosion_time, explosionSound)
 
 # Projectile class for all bullets and missiles (player and enemy)
 class Projectile(GameObject):
-    def __init__(self, surface, sprite, xPos, yPos, direction="up"): 
+    __slots__ = ("_direction",)
+    pool = None # ObjectPool used by spawn(), set up below; None builds a new Projectile every time
+
+    def __init__(self, surface, sprite, xPos, yPos, direction="up"):
         # Direction is "up" for player, "down" for enemy projectiles
         super().__init__(surface, sprite, xPos, yPos, 10)
         self._direction = direction
 
+    @classmethod
+    def spawn(cls, surface, sprite, xPos, yPos, direction="up"):
+        # Get a projectile from Projectile.pool (or a new one without a pool). None if the pool drops the request
+        if cls.pool is None:
+            return cls(surface, sprite, xPos, yPos, direction)
+        projectile = cls.pool.acquire()
+        if projectile is not None:
+            projectile.__init__(surface, sprite, xPos, yPos, direction)
+        return projectile
+
     def Movement(self):
         # Move the projectile up (player) or down (enemy)
-        if self._direction == "up": 
+        if self._direction == "up":
             self._yPos -= self._speed
             # Clamp position off screen if gone
-            if self._yPos < -self._sprite.get_height():
-                self._yPos = -self._sprite.get_height()
-        elif self._direction == "down":  
+            if self._yPos < -self._height:
+                self._yPos = -self._height
+        elif self._direction == "down":
             self._yPos += self._speed
 
-    def get_rect(self):
-        # Get the rect for collision detection
-        return pygame.Rect(self._xPos, self._yPos, self._sprite.get_width(), self._sprite.get_height())
+# Every shot fired in game is recycled through this pool
+Projectile.pool = ObjectPool(lambda: Projectile(None, None, 0, 0), capacity=projectile_pool_size)
 
 # Enemy class for enemy aircraft
-class Enemy(GameObject):    
+class Enemy(GameObject):
+    __slots__ = ()
+
     def __init__(self, surface, sprite, xPos, yPos):
         # Initialise enemy at position, set downward speed
         super().__init__(surface, sprite, xPos, yPos, 3)
 
-    def update(self, enemies, missiles, bullets, enemyBullets, enemyBulletSprite, enemyBullet_width, enemyBullet_height, explosionSprite, explosions, explosion_time, explosionSound, screenHeight, score_ref):
+    def update(self, enemies, missiles, bullets, enemyBullets, enemyBulletSprite, enemyBullet_width, enemyBullet_height, explosionSprite, explosions, explosion_time, explosionSound, screenHeight, score_ref, grid=None, masks=None):
         # Update enemy position, shoot, and handle collisions
         self.move_and_shoot(enemyBullets, enemyBulletSprite, enemyBullet_width, enemyBullet_height)
-        self.handle_collisions(enemies, missiles, bullets, explosionSprite, explosions, explosion_time, explosionSound, score_ref)
+        self.handle_collisions(enemies, missiles, bullets, explosionSprite, explosions, explosion_time, explosionSound, score_ref, grid, masks)
         # Remove enemy if it moves off the bottom of the screen
         if self.getYPos() > screenHeight and self in enemies:
             enemies.remove(self)
@@ -222,255 +329,649 @@ class Enemy(GameObject):
         self._yPos += self._speed
         # Enemy randomly shoots bullets downwards
         if random.random() < 0.02:
-            bullet_x = self.getXPos() + self._sprite.get_width() // 2 - enemyBullet_width // 2
-            bullet_y = self.getYPos() + self._sprite.get_height()
-            enemyBullets.append(Projectile(self._surface, enemyBulletSprite, bullet_x, bullet_y, direction="down"))
-
-    def handle_collisions(self, enemies, missiles, bullets, explosionSprite, explosions, explosion_time, explosionSound, score_ref):
-        # Handle collision with missiles and bullets
+            bullet_x = self.getXPos() + self._width // 2 - enemyBullet_width // 2
+            bullet_y = self.getYPos() + self._height
+            ebullet = Projectile.spawn(self._surface, enemyBulletSprite, bullet_x, bullet_y, direction="down")
+            if ebullet is not None:
+                enemyBullets.append(ebullet)
+
+    def handle_collisions(self, enemies, missiles, bullets, explosionSprite, explosions, explosion_time, explosionSound, score_ref, grid=None, masks=None):
+        # Handle collision with missiles first, then bullets (pixel-perfect with a MaskCache)
         enemy_rect = self.get_rect()
-        # Collision with missile
-        for missile in missiles[:]:
-            if missile.get_rect().colliderect(enemy_rect):
-                if missile in missiles:
-                    missiles.remove(missile)
-                spawn_explosion_at_object(self, explosionSprite, explosions, explosion_time, explosionSound)
-                if self in enemies:
-                    enemies.remove(self)
-                score_ref[0] += 1
-                return
-        # Collision with bullet
-        for bullet in bullets[:]:
-            if bullet.get_rect().colliderect(enemy_rect):
-                if bullet in bullets:
-                    bullets.remove(bullet)
-                spawn_explosion_at_object(self, explosionSprite, explosions, explosion_time, explosionSound)
-                if self in enemies:
-                    enemies.remove(self)
-                score_ref[0] += 1
-                return
-
-### Functions ###
+        for group, projectiles in (("missiles", missiles), ("bullets", bullets)):
+            # With a broadphase grid (see spatial.py) only nearby projectiles are tested, otherwise all of them
+            candidates = grid.query(group, enemy_rect) if grid is not None else projectiles[:]
+            for projectile in candidates:
+                projectile_rect = projectile.get_rect()
+                if projectile_rect.colliderect(enemy_rect) and (masks is None or masks.overlap(self, enemy_rect, projectile, projectile_rect)):
+                    if projectile in projectiles:
+                        projectiles.remove(projectile)
+                        projectile.free()
+                    if grid is not None:
+                        grid.remove(projectile)
+                    spawn_explosion_at_object(self, explosionSprite, explosions, explosion_time, explosionSound)
+                    if self in enemies:
+                        enemies.remove(self)
+                    score_ref[0] += 1
+                    return
+
+# Every image and sound the game needs, loaded once after the display is set up
+class Assets:
+    def __init__(self, headless=False, manager=None, stream=False):
+        # Images come through the AssetManager (see assets.py): converted to the display format
+        # and read back from its pixel cache after the first start. Files are loaded by an
+        # AssetLoader: all of them right here, or with stream=True on worker threads while the
+        # caller polls assets.loader. Until a streamed image arrives a placeholder stands in
+        self.manager = manager if manager is not None else AssetManager(ASSET_DIR)
+
+        # Background placeholder: the colour of the sea
+        self.BG = pygame.Surface((screenWidth, screenHeight)).convert()
+        self.BG.fill((24, 70, 110))
+
+        # Create a sprite for player bullets
+        self.playerBulletSprite = pygame.Surface((bullet_width, bullet_height), pygame.SRCALPHA)
+        self.playerBulletSprite.fill((255, 255, 0))
+
+        # Create a sprite for player missiles
+        self.playerMissileSprite = pygame.Surface((missile_width, missile_height), pygame.SRCALPHA)
+        self.playerMissileSprite.fill((255, 0, 0))
+
+        # Create a sprite for enemy bullets
+        self.enemyBulletSprite = pygame.Surface((enemyBullet_width, enemyBullet_height), pygame.SRCALPHA)
+        self.enemyBulletSprite.fill((0, 255, 255))
+
+        # Explosion placeholders: only the sprite's size matters to the game, and the frames list
+        # is filled in place so the World's EffectBuffer picks up the real animation
+        self.explosionSprite = pygame.Surface((32, 32), pygame.SRCALPHA)
+        placeholder = pygame.Surface((32, 32), pygame.SRCALPHA)
+        pygame.draw.circle(placeholder, (255, 160, 40, 200), (16, 16), 12)
+        self.explosionFrames = [(placeholder, (0, 0))]
+        self.endcard = None
+
+        # Font for HUD (and the loading screen)
+        self.font = self.manager.timed("font", pygame.font.SysFont, None, 28)
+
+        # Sound effects share a fixed set of mixer channels (see audio.py). Headless runs never
+        # decode or play any audio; the silent mixer only counts what would have played
+        self.effects = SoundEffects(backend=SilentMixer() if headless else None)
+
+        # Sound effects with their volumes. The life-lost cue gets the reserved channel, the rest
+        # are limited to one play per few frames. Each is silent until its file has loaded
+        effects = self.effects
+        self.playerLoseLifeSound = effects.add("lose_life", None, volume=1, priority=True)
+        self.gunshotSound = effects.add("gunshot", None, volume=0.1, min_interval_ms=50)
+        self.missileSound = effects.add("missile", None, volume=0.5, min_interval_ms=100)
+        self.explosionSound = effects.add("explosion", None, volume=0.1, min_interval_ms=30)
+
+        self.loader = AssetLoader(self.manager, self.requests(headless), self.asset_ready)
+        if stream:
+            self.loader.start()
+        else:
+            self.loader.load_all()
+
+    def requests(self, headless=False):
+        # Everything loaded from files. The game can start once the player, enemy and bullet
+        # sprites are in; the bullet sprites are made in __init__, so that means the planes
+        images = "libraryofimages"
+        requests = [
+            # Player sprites (for forward, left, and right movement) and the enemy sprite
+            AssetRequest("playerMovingForwardSprite", "image", (images, "FA-18moving.png"), alpha=True, critical=True),
+            AssetRequest("playerMovingLeftSprite", "image", (images, "FA-18movingleft.png"), alpha=True, critical=True),
+            AssetRequest("playerMovingRightSprite", "image", (images, "FA-18movingright.png"), alpha=True, critical=True),
+            AssetRequest("enemySprite", "image", (images, "enemyF-4.png"), alpha=True, critical=True),
+            # Background scaled to the screen
+            AssetRequest("BG", "image", (images, "water.jpeg"), size=(screenWidth, screenHeight)),
+            # Explosion sprite scaled down, and the full size image its animation is rendered from
+            AssetRequest("explosionSprite", "image", (images, "explosion_Boom_2.png"), size=(32, 32), alpha=True),
+            AssetRequest("explosionImage", "image", (images, "explosion_Boom_2.png"), alpha=True),
+            # End screen image scaled to screen size (it is fully opaque, so plain convert)
+            AssetRequest("endcard", "image", (images, "dead.png"), size=(screenWidth, screenHeight)),
+        ]
+        if not headless:
+            requests += [
+                AssetRequest("lose_life", "sound", ("fx", "805693__edimar_ramide__death2.wav")),
+                AssetRequest("gunshot", "sound", ("fx", "gunshot-fx-zap.wav")),
+                AssetRequest("missile", "sound", ("fx", "launching-missile-313226.mp3")),
+                AssetRequest("explosion", "sound", ("fx", "dry-explosion-fx.wav")),
+            ]
+        return requests
+
+    def asset_ready(self, request, value):
+        # Called on the main thread as each request finishes loading
+        if request.kind == "sound":
+            self.effects.set_sound(request.name, value)
+        elif request.name == "explosionImage":
+            self.explosionFrames[:] = self.manager.timed("explosion frames", explosion_frames, value, 32)
+        else:
+            setattr(self, request.name, value)
+
+# Holds the whole game state and advances it one tick at a time, without drawing anything
+class World:
+    def __init__(self, surface, assets, broadphase=True, profiler=None, pixel_perfect=False):
+        self._surface = surface
+        self._assets = assets
+        # Per-phase timing (see profiler.py); the shared disabled one costs next to nothing
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        # Collision broadphase rebuilt each tick; None falls back to testing every pair
+        self.grid = SpatialHash(screenWidth, screenHeight) if broadphase else None
+        # Opt-in pixel-perfect narrowphase behind the rect tests; None hits on the whole sprite rect
+        self.masks = MaskCache.for_assets(assets) if pixel_perfect else None
+        # Every countdown in the game (gun cooldowns, enemy spawns, explosions) is an event here.
+        # Pause it or change its scale for a pause menu or slow motion
+        self.scheduler = Scheduler()
+
+        # Create the player object, positioned at the bottom center of the screen
+        forward = assets.playerMovingForwardSprite
+        self.player = Player(surface, forward, assets.playerMovingLeftSprite, assets.playerMovingRightSprite, (screenWidth - forward.get_width()) // 2, screenHeight - forward.get_height(), assets.playerLoseLifeSound, self.scheduler)
+
+        # Lists to hold all in-game objects for easy management
+        self.bullets = [] # List of player bullets
+        self.missiles = [] # List of player missiles
+        self.enemies = [] # List of All enemy planes
+        self.enemyBullets = [] # List of All enemy bullets
+        self.explosions = EffectBuffer(self.scheduler, assets.explosionFrames, explosion_capacity) # All explosions (active)
+
+        # Initialise game state variables
+        self.score = 0 # Player score
+        self._spawn_timer = None
+        self._spawns_due = 0 # Spawn events fired this tick, turned into enemies by spawn_enemies()
+        self.enemy_spawn_delay = enemy_spawn_delay # Tunables, copied so one World can be changed on its own
+        self.explosion_time = explosion_time
+        self.missile_homing_speed = missile_homing_speed
+        self.bg_offset = 0 # Scrolling background offset
+        self.prev_bg_offset = 0 # Offset before the last tick
+        self.interpolate = False # Keep positions from before each tick for Renderer.draw(world, alpha)
+        self.ticks = 0 # Number of simulation steps run so far
+        self.collision_tests = 0 # Object pairs sent to the colliderect narrowphase last tick
+        self.game_over = False
+
+    @property
+    def enemy_spawn_delay(self):
+        return self._enemy_spawn_delay
+
+    @enemy_spawn_delay.setter
+    def enemy_spawn_delay(self, value):
+        # A new delay also moves the pending spawn, counting from the last one
+        self._enemy_spawn_delay = value
+        if self._spawn_timer is None:
+            self._spawn_timer = self.scheduler.schedule(self.spawn_interval(), self._spawn_due)
+        else:
+            self._spawn_timer = self.scheduler.reschedule(self._spawn_timer, self.spawn_interval())
+
+    def spawn_interval(self):
+        # Ticks between spawns: how many steps of enemy_spawn_rate it takes to reach the delay
+        progress = 0
+        ticks = 0
+        while progress < self._enemy_spawn_delay:
+            progress += enemy_spawn_rate
+            ticks += 1
+        return max(ticks, 1)
+
+    def _spawn_due(self):
+        self._spawns_due += 1
+        self._spawn_timer = self.scheduler.schedule(self.spawn_interval(), self._spawn_due)
+
+    def step(self, keys):
+        # Advance the game by one tick. keys is pygame.key.get_pressed() or a dict of held keys
+        assets = self._assets
+        player = self.player
+        mark = self.profiler.mark
+        self.collision_tests = 0
+        grid_candidates = self.grid.candidates if self.grid is not None else 0
+
+        if self.interpolate:
+            self.remember_positions()
+        # Fire the timers that came due: gun cooldowns, enemy spawns, finished explosions
+        self.scheduler.advance()
+        mark("timers")
+        # Handle player movement
+        player.Movement(keys)
+        mark("movement")
+        # Check for collisions with enemies/enemy bullets
+        grid = self.rebuild_grid(1, ("enemies", self.enemies), ("enemyBullets", self.enemyBullets))
+        player.handle_collisions(self.enemies, self.enemyBullets, self.explosions, assets.explosionSprite, self.explosion_time, assets.explosionSound, grid, self.masks)
+        mark("player_collisions")
+        # Player auto-shoots bullets
+        player.shoot(keys, self.bullets, assets.playerBulletSprite, bullet_width, assets.gunshotSound)
+        # Player fires missile if space is pressed and not on cooldown
+        player.shoot_missile(keys, self.missiles, assets.playerMissileSprite, missile_width, missile_height, assets.missileSound)
+        mark("shooting")
+
+        # Scroll the background by incrementing offset, looping when past image height
+        self.scroll_background()
+
+        # Move all player bullets and remove those that go off the top of the screen
+        for bullet in self.bullets[:]:
+            bullet.Movement()
+            if bullet.getYPos() <= -bullet_height:
+                self.bullets.remove(bullet)
+                bullet.free()
+        mark("bullets")
+
+        # Move all missiles, handle homing and remove if off-screen
+        self.update_missiles()
+        mark("missile_homing")
+
+        # Handle enemy spawning based on timer
+        self.spawn_enemies()
+
+        # Move all enemy bullets and remove those off bottom of screen
+        for ebullet in self.enemyBullets[:]:
+            ebullet.Movement()
+            if ebullet.getYPos() > screenHeight:
+                self.enemyBullets.remove(ebullet)
+                ebullet.free()
+
+        # Update all enemies (move, shoot, handle collisions)
+        grid = self.rebuild_grid(len(self.enemies), ("missiles", self.missiles), ("bullets", self.bullets))
+        score_ref = [self.score]  # Mutable list to allow score updates by reference
+        for enemy in self.enemies[:]:
+            enemy.update(
+                self.enemies, self.missiles, self.bullets,
+                self.enemyBullets, assets.enemyBulletSprite, enemyBullet_width, enemyBullet_height,
+                assets.explosionSprite, self.explosions, self.explosion_time, assets.explosionSound,
+                screenHeight, score_ref, grid, self.masks
+            )
+        self.score = score_ref[0]
+        mark("enemies")
+
+        if self.grid is not None:
+            self.collision_tests += self.grid.candidates - grid_candidates
+        self.ticks += 1
+        if player.is_dead():
+            self.game_over = True
+
+    def rebuild_grid(self, queries, *groups):
+        # Refill the broadphase grid with (name, objects) groups for `queries` upcoming queries.
+        # Returns None (test every pair) when the broadphase is off or there are too few pairs to pay for the rebuild
+        grid = self.grid
+        pairs = queries * sum(len(objects) for _, objects in groups)
+        if grid is None or pairs < broadphase_min_pairs:
+            self.collision_tests += pairs # Every pair gets tested
+            return None
+        grid.clear()
+        for name, objects in groups:
+            grid.insert_all(name, objects)
+        return grid
+
+    def remember_positions(self):
+        # Note where everything is before this tick moves it
+        self.prev_bg_offset = self.bg_offset
+        self.player.remember_position()
+        for group in (self.bullets, self.missiles, self.enemies, self.enemyBullets):
+            remember = getattr(group, "remember_positions", None)
+            if remember is not None:
+                remember() # Entity stores copy their position arrays
+            else:
+                for obj in group:
+                    obj.remember_position()
+
+    def scroll_background(self):
+        # Scroll the background by incrementing offset, looping when past image height
+        self.bg_offset += 1
+        if self.bg_offset >= self._assets.BG.get_height():
+            self.bg_offset = 0
+
+    def spawn_enemies(self):
+        # Add a new enemy at a random x along the top for each spawn event this tick
+        enemySprite = self._assets.enemySprite
+        while self._spawns_due:
+            enemy_x = random.randint(0, screenWidth - enemySprite.get_width())
+            self.enemies.append(Enemy(self._surface, enemySprite, enemy_x, 0))
+            self._spawns_due -= 1
+
+    def update_missiles(self):
+        # Move all missiles, remove the ones off-screen and steer the rest towards the closest enemy
+        for missile in self.missiles[:]:
+            missile.Movement()
+            if missile.getYPos() <= -missile_height:
+                self.missiles.remove(missile)
+                missile.free()
+        # If there are enemies, home in on the closest one
+        if self.missiles and self.enemies:
+            enemy_half_width = self._assets.enemySprite.get_width() // 2
+            self.home_missiles(self.missiles, self.build_target_index(), missile_width, missile_height, enemy_half_width, self.missile_homing_speed)
+
+    def build_target_index(self):
+        # Index every enemy by its centre, once per tick, for all homing weapons to share
+        enemySprite = self._assets.enemySprite
+        half_width = enemySprite.get_width() // 2
+        half_height = enemySprite.get_height() // 2
+        targets = TargetIndex()
+        for enemy in self.enemies:
+            targets.add(enemy.getXPos() + half_width, enemy.getYPos() + half_height, enemy)
+        return targets
 
-def spawn_explosion_at_object(obj, explosionSprite, explosions, explosion_time, explosionSound): 
-    # Spawn an explosion centered at the object's position and play the explosion sound
-    explosion_x = obj.getXPos() + obj._sprite.get_width() // 2 - explosionSprite.get_width() // 2
-    explosion_y = obj.getYPos() + obj._sprite.get_height() // 2 - explosionSprite.get_height() // 2
-    explosions.append([explosion_x, explosion_y, explosion_time])
-    explosionSound.play()
+    @staticmethod
+    def home_missiles(missiles, targets, width, height, target_half_width, homing_speed):
+        # Find the closest target for every missile of one size in one batch, then steer towards it
+        centres = [(missile.getXPos() + width // 2, missile.getYPos() + height // 2) for missile in missiles]
+        for missile, (missile_center_x, _), closest_enemy in zip(missiles, centres, targets.nearest_many(centres)):
+            if closest_enemy is None:
+                continue
+            # Calculate horizontal distance to closest enemy's center
+            dx = closest_enemy.getXPos() + target_half_width - missile_center_x
+            # Only home if enemy is above missile
+            if closest_enemy.getYPos() < missile.getYPos():
+                # Cap the homing adjustment speed per frame
+                if abs(dx) > homing_speed:
+                    dx = homing_speed if dx > 0 else -homing_speed
+                missile._xPos += dx
 
-### Initialisation ###
+    def hitboxes(self):
+        # Rects of every object with a hitbox, player first
+        return [obj.get_rect() for obj in [self.player] + self.bullets + self.missiles + self.enemies + self.enemyBullets]
+
+    def collision_rects(self):
+        # Hitboxes of each group that takes part in collisions, by group name
+        groups = {"missiles": self.missiles, "bullets": self.bullets, "enemies": self.enemies, "enemyBullets": self.enemyBullets}
+        return {name: [obj.get_rect() for obj in objects] for name, objects in groups.items()}
+
+    def entity_counts(self):
+        # How many of each kind of entity are live
+        return {
+            "bullets": len(self.bullets),
+            "missiles": len(self.missiles),
+            "enemies": len(self.enemies),
+            "enemyBullets": len(self.enemyBullets),
+            "explosions": len(self.explosions),
+        }
+
+    def close(self):
+        # Call when this World is thrown away: its live projectiles go back to Projectile.pool,
+        # which every World in the process shares, so many games in one process (batch.py,
+        # benchmark.py) keep reusing the same few objects instead of growing the pool
+        for group in (self.bullets, self.missiles, self.enemyBullets):
+            for projectile in group:
+                projectile.free()
+            group.clear()
+
+# Draws a World onto the screen surface. Kept apart from World so the simulation can run without it
+class Renderer:
+    def __init__(self, surface, assets, dirty_rects=False):
+        self._surface = surface
+        self._assets = assets
+        self.hud = Hud(assets.font, use_glyph_atlas=True) # Lives/health/score text, re-rendered only on change
+        self.queue = RenderQueue() # Sprites gathered per layer and drawn with one blits call each
+        # Optional dirty-rectangle updates instead of pushing the whole screen every frame
+        self.dirty = DirtyRects(assets.BG, surface.get_size()) if dirty_rects else None
+
+    def assets_changed(self):
+        # Streamed-in assets replaced placeholders; the dirty-rect backdrop holds the old background
+        if self.dirty is not None:
+            self.dirty.set_background(self._assets.BG)
+
+    def draw(self, world, alpha=None):
+        # Draw all game elements, including background, bullets, enemies, explosions, and player HUD info.
+        # With alpha (0-1, needs world.interpolate) everything is drawn that far between its position
+        # before the last tick and its current one, so motion stays smooth when frames and ticks drift apart
+        assets = self._assets
+        BG = assets.BG
+        player = world.player
+        queue = self.queue
 
-pygame.init()  # Initialise all imported pygame modules
+        # Draw the scrolling background (twice for seamless vertical looping)
+        BG_height = BG.get_height()
+        bg_offset = world.bg_offset
+        if alpha is not None:
+            previous = world.prev_bg_offset
+            bg_offset = previous + (bg_offset - previous) % BG_height * alpha # Modulo handles the wrap to 0
+        if self.dirty is not None:
+            queue.extend(LAYER_BACKGROUND, self.dirty.background_items(bg_offset))
+        else:
+            bg_offset_int = int(bg_offset)
+            queue.add(LAYER_BACKGROUND, BG, (0, bg_offset_int - BG_height))
+            queue.add(LAYER_BACKGROUND, BG, (0, bg_offset_int))
+
+        # Player bullets and missiles, enemies and enemy bullets
+        self.queue_group(LAYER_PLAYER_SHOTS, world.bullets, alpha)
+        self.queue_group(LAYER_PLAYER_SHOTS, world.missiles, alpha)
+        self.queue_group(LAYER_ENEMIES, world.enemies, alpha)
+        self.queue_group(LAYER_ENEMY_SHOTS, world.enemyBullets, alpha)
+        # All explosions, each on the animation frame for its age
+        self.queue_group(LAYER_EFFECTS, world.explosions, alpha)
+        # Player sprite on top of everything
+        queue.add(LAYER_PLAYER, *player.blit_item(alpha))
+        # Player lives, health and score
+        queue.extend(LAYER_HUD, self.hud.items(player._lives, player._health, world.score))
+
+        if self.dirty is not None:
+            self.dirty.frame_drawn(queue.flush(self._surface, rects_from=LAYER_BACKGROUND + 1))
+        else:
+            queue.flush(self._surface)
 
-# Set up the display window (320x480 pixels)
-screenWidth = 320
-screenHeight = 480
-surface = pygame.display.set_mode((screenWidth, screenHeight))
+    def present(self):
+        # Show the drawn frame: whole screen, or only the dirty rects in dirty-rect mode
+        if self.dirty is not None:
+            self.dirty.present()
+        else:
+            pygame.display.update()
 
-# Load and scale the background image for the game
-BG = pygame.image.load("Intro/libraryofimages/water.jpeg").convert() 
-BG = pygame.transform.scale(BG, (screenWidth, screenHeight))  
+    def queue_group(self, z, group, alpha=None):
+        # Entity stores (see entity_store.py) and effect buffers hand over all their sprite positions at once
+        blit_sequence = getattr(group, "blit_sequence", None)
+        if blit_sequence is not None:
+            self.queue.extend(z, blit_sequence(alpha))
+        else:
+            self.queue.extend(z, [obj.blit_item(alpha) for obj in group])
 
-# Set up the game clock for controlling frame rate (FPS)
-clock = pygame.time.Clock()
-cSpeed = 60  # Target frames per second
+    def draw_endcard(self):
+        # Cover the screen with the game over image
+        self._surface.blit(self._assets.endcard, (0, 0))
+        if self.dirty is not None:
+            self.dirty.invalidate()
 
-# Set the window title bar text
-title = "desertstorm"
-pygame.display.set_caption(title)
+### Functions ###
 
-# Define bullet and missile sprite sizes
-bullet_width, bullet_height = 4, 8
-missile_width, missile_height = 6, 12
-enemyBullet_width, enemyBullet_height = 4, 8
+def spawn_explosion_at_object(obj, explosionSprite, explosions, explosion_time, explosionSound):
+    # Spawn an explosion centered at the object's position and play the explosion sound
+    explosion_x = obj.getXPos() + obj._width // 2 - explosionSprite.get_width() // 2
+    explosion_y = obj.getYPos() + obj._height // 2 - explosionSprite.get_height() // 2
+    explosions.append([explosion_x, explosion_y, explosion_time])
+    explosionSound.play()
 
-# Load player sprites (for forward, left, and right movement)
-playerMovingForwardSprite = pygame.image.load("Intro/libraryofimages/FA-18moving.png").convert_alpha()
-playerMovingLeftSprite = pygame.image.load("Intro/libraryofimages/FA-18movingleft.png").convert_alpha()
-playerMovingRightSprite = pygame.image.load("Intro/libraryofimages/FA-18movingright.png").convert_alpha()
-playerLoseLifeSound = pygame.mixer.Sound("Intro/fx/805693__edimar_ramide__death2.wav")
-
-# Create a sprite for player bullets and load gunshot sound
-playerBulletSprite = pygame.Surface((bullet_width, bullet_height), pygame.SRCALPHA)
-playerBulletSprite.fill((255, 255, 0))
-gunshotSound = pygame.mixer.Sound("Intro/fx/gunshot-fx-zap.wav")
-
-# Create a sprite for player missiles and load missile launch sound
-playerMissileSprite = pygame.Surface((missile_width, missile_height), pygame.SRCALPHA)
-playerMissileSprite.fill((255, 0, 0))
-missileSound = pygame.mixer.Sound("Intro/fx/launching-missile-313226.mp3")
-
-# Load enemy sprite and create sprite for enemy bullets
-enemySprite = pygame.image.load("Intro/libraryofimages/enemyF-4.png").convert_alpha()
-enemyBulletSprite = pygame.Surface((enemyBullet_width, enemyBullet_height), pygame.SRCALPHA)
-enemyBulletSprite.fill((0, 255, 255))
-
-# Load explosion sprite, scale it, and load explosion sound
-explosionSprite = pygame.image.load("Intro/libraryofimages/explosion_Boom_2.png").convert_alpha()
-explosionSprite = pygame.transform.scale(explosionSprite, (32, 32))  
-explosionSound = pygame.mixer.Sound("Intro/fx/dry-explosion-fx.wav")
-
-# Load end screen image and scale to screen size
-endcard = pygame.image.load("intro/libraryofimages/dead.png")
-endcard = pygame.transform.scale(endcard, (screenWidth, screenHeight))
-
-# Create the player object, positioned at the bottom center of the screen
-player = Player(surface, playerMovingForwardSprite, playerMovingLeftSprite, playerMovingRightSprite, (screenWidth - playerMovingForwardSprite.get_width()) // 2, screenHeight - playerMovingForwardSprite.get_height())
-
-# Lists to hold all in-game objects for easy management
-bullets = [] # List of player bullets
-missiles = [] # List of player missiles
-enemies = [] # List of All enemy planes
-enemyBullets = [] # List of All enemy bullets
-explosions = [] #List of All explosions (active)
-
-# Dictionary mapping soundtrack numbers to loaded pygame Sound objects
-audiopath = {
-    1: pygame.mixer.Sound("Intro/soundtrack/soundtrack1.mp3"),
-    2: pygame.mixer.Sound("Intro/soundtrack/soundtrack2.mp3"),
-    3: pygame.mixer.Sound("Intro/soundtrack/soundtrack3.mp3"),
-    4: pygame.mixer.Sound("Intro/soundtrack/soundtrack4.mp3"),
-    5: pygame.mixer.Sound("Intro/soundtrack/soundtrack5.mp3"),
-    6: pygame.mixer.Sound("Intro/soundtrack/soundtrack6.mp3"),
-    7: pygame.mixer.Sound("Intro/soundtrack/soundtrack7.mp3")
-}
-
-# Randomly choose one soundtrack and start playing it in a loop
-soundtrack_choice = random.randint(1, 7)
-current_soundtrack = audiopath[soundtrack_choice]
-current_soundtrack.play(-1)  # -1 means loop forever
-
-# Set all soundtrack volumes and print the currently playing one
-for i in range(1, 8):
-    audiopath[i].set_volume(0.60)
-    if i == soundtrack_choice:
-        print(f"Current soundtrack: Soundtrack {i}")
-
-# Set volume for sound effects
-explosionSound.set_volume(0.1) 
-gunshotSound.set_volume(0.1) 
-missileSound.set_volume(0.5)
-playerLoseLifeSound.set_volume(1)
-
-# Initialise game state variables
-score = 0 # Player score
-explosion_time = 30 # Frames an explosion lasts
-missile_homing_speed = 8 # Max speed for missile homing
-enemy_spawn_timer = 0 # Timer for next enemy spawn
-enemy_spawn_delay = 40 # Frames between enemy spawns
-font = pygame.font.SysFont(None, 28) # Font for HUD
-bg_offset = 0 # Scrolling background offset
+def init_display(headless=False):
+    # Initialise pygame and open the game window. Headless uses SDL's dummy drivers so no window or audio device is needed
+    if headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.init()  # Initialise all imported pygame modules
+    surface = pygame.display.set_mode((screenWidth, screenHeight))
+    pygame.display.set_caption(title)
+    return surface
+
+def create_world(headless=False, entity_store=False, pixel_perfect=False):
+    # Set up the display, load assets and build a fresh World. Returns (surface, assets, world)
+    surface = init_display(headless)
+    assets = Assets(headless)
+    return surface, assets, new_world(surface, assets, entity_store, pixel_perfect)
+
+def new_world(surface, assets, entity_store=False, pixel_perfect=False):
+    # entity_store=True uses the NumPy-backed ArrayWorld (needs numpy) for bullet-heavy scenes.
+    # pixel_perfect=True adds the mask narrowphase, which only the object World has
+    if entity_store:
+        if pixel_perfect:
+            raise ValueError("pixel-perfect collisions need the object World, not the entity store")
+        from entity_store import ArrayWorld
+        return ArrayWorld(surface, assets)
+    return World(surface, assets, pixel_perfect=pixel_perfect)
+
+def show_loading(surface, assets):
+    # Loading screen while the worker threads load the critical assets; every other asset
+    # keeps streaming in after it. Returns False if the window was closed
+    loader = assets.loader
+    font = assets.font
+    bar = pygame.Rect(40, screenHeight // 2 + 20, screenWidth - 80, 12)
+    while not loader.critical_ready:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        loader.poll()
+        done, total = loader.progress()
+        surface.fill((0, 0, 0))
+        text = font.render("Loading...", True, (255, 255, 255))
+        surface.blit(text, text.get_rect(midbottom=(screenWidth // 2, bar.top - 8)))
+        pygame.draw.rect(surface, (255, 255, 255), bar, 1)
+        pygame.draw.rect(surface, (255, 255, 255), (bar.x, bar.y, bar.width * done // max(1, total), bar.height))
+        pygame.display.flip()
+        loader.wait_any(timeout=1 / render_rate) # Redraw at least once a frame's time
+    return True
+
+def run_headless(ticks, keys=None, seed=None, entity_store=False):
+    # Run the simulation as fast as the CPU allows: no window, no sound, no frame cap
+    if seed is not None:
+        random.seed(seed)
+    keys = keys if keys is not None else {}
+    surface, assets, world = create_world(headless=True, entity_store=entity_store)
+    for _ in range(ticks):
+        world.step(keys)
+        if world.game_over:
+            break
+    return world
 
 ### Main game loop ###
-running = True
-show_hitboxes = False
-
-
-while running:
-    # Process all events (keyboard, window close, etc.)
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False   # Exit loop if window is closed
-
-    # Get state of all keys (pressed or not)
-    keys = pygame.key.get_pressed()
-    # Handle player movement
-    player.Movement(keys)
-    # Check for collisions with enemies/enemy bullets
-    player.handle_collisions(enemies, enemyBullets, explosions, explosionSprite, explosion_time, explosionSound) 
-    # Player auto-shoots bullets
-    player.shoot(keys, bullets, playerBulletSprite, bullet_width, gunshotSound)
-    # Player fires missile if space is pressed and not on cooldown
-    player.shoot_missile(keys, missiles, playerMissileSprite, missile_width, missile_height, missileSound)
-    hitbox_debugger = HitboxDebugger(surface)
-    
-
-    # Draw hitboxes (for debugging purposes only)
-    for obj in [player] + bullets + missiles + enemies + enemyBullets:
-        hitbox_debugger.draw_hitbox(obj)
-        
-    
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_h:
-                show_hitboxes = not show_hitboxes
-                
-    # Later in main loop
-    if show_hitboxes:
-        for obj in [player] + bullets + missiles + enemies + enemyBullets:
-            hitbox_debugger.draw_hitbox(obj)
-
-    # Scroll the background by incrementing offset, looping when past image height
-    bg_offset += 1
-    if bg_offset >= BG.get_height():
-        bg_offset = 0
-
-    # Move all player bullets and remove those that go off the top of the screen
-    for bullet in bullets[:]:
-        bullet.Movement()
-        if bullet.getYPos() < -bullet_height:
-            bullets.remove(bullet)
-
-    # Move all missiles, handle homing and remove if off-screen
-    for missile in missiles[:]:
-        missile.Movement()
-        if missile.getYPos() < -missile_height:
-            missiles.remove(missile)
-            continue 
-        # If there are enemies, home in on the closest one
-        if enemies:
-            # Find the closest enemy by distance
-            closest_enemy = min(enemies, key=lambda e: math.hypot( 
-                e.getXPos() + enemySprite.get_width() // 2 - (missile.getXPos() + missile_width // 2), 
-                e.getYPos() + enemySprite.get_height() // 2 - (missile.getYPos() + missile_height // 2) 
-            ))
-            # Calculate horizontal distance to closest enemy's center
-            missile_center_x = missile.getXPos() + missile_width // 2
-            enemy_center_x = closest_enemy.getXPos() + enemySprite.get_width() // 2
-            dx = enemy_center_x - missile_center_x
-            # Only home if enemy is above missile
-            if closest_enemy.getYPos() < missile.getYPos():
-                # Cap the homing adjustment speed per frame
-                if abs(dx) > missile_homing_speed:
-                    dx = missile_homing_speed if dx > 0 else -missile_homing_speed
-                missile._xPos += dx
 
-    # Handle enemy spawning based on timer
-    enemy_spawn_timer += 1.3 
-    if enemy_spawn_timer >= enemy_spawn_delay:
-        enemy_x = random.randint(0, screenWidth - enemySprite.get_width())
-        enemies.append(Enemy(surface, enemySprite, enemy_x, 0))
-        enemy_spawn_timer = 0
-    
-    # Move all enemy bullets and remove those off bottom of screen
-    for ebullet in enemyBullets[:]:
-        ebullet.Movement()
-        if ebullet.getYPos() > screenHeight:
-            enemyBullets.remove(ebullet)
-
-    # Update all enemies (move, shoot, handle collisions)
-    score_ref = [score]  # Mutable list to allow score updates by reference
-    for enemy in enemies[:]:
-        enemy.update(
-            enemies, missiles, bullets,
-            enemyBullets, enemyBulletSprite, enemyBullet_width, enemyBullet_height,
-            explosionSprite, explosions, explosion_time, explosionSound,
-            screenHeight, score_ref
-        )
-    score = score_ref[0]
-
-    # Update all explosions (reduce the timer and remove explosions)
-    for exp in explosions[:]:
-        exp[2] -= 1 
-        if exp[2] <= 0:
-            explosions.remove(exp)
-
-    # Draw everything and update display
-    GameObject.Draw(surface)
-    pygame.display.update()
-    clock.tick(cSpeed)  # FPS
-
-pygame.quit()  # Close window
\ No newline at end of file
+def main(entity_store=False, dirty_rects=False, profile=False, trace_path=None, record_path=None, asset_report=False, frame_rate=render_rate, catch_up=max_catch_up,
+         gc_policy=True, alloc_trace=0, pixel_perfect=False):
+    recorder = None
+    if record_path is not None:
+        # Record the session: seed the game RNG so a replay can start from the same state
+        from replay import InputRecorder, new_seed
+        recorder = InputRecorder(new_seed(), entity_store=entity_store, pixel_perfect=pixel_perfect)
+        random.seed(recorder.seed)
+    # Assets load on worker threads; play starts once the planes are in and the rest follows
+    surface = init_display()
+    assets = Assets(stream=True)
+    if not show_loading(surface, assets):
+        assets.loader.close()
+        pygame.quit()
+        return
+    world = new_world(surface, assets, entity_store, pixel_perfect)
+    renderer = Renderer(surface, assets, dirty_rects)
+    # Frame profiler: F3 shows/hides its graph while profiling
+    profiler = FrameProfiler(enabled=profile or trace_path is not None, record=trace_path is not None)
+    world.profiler = profiler
+    # Stream one randomly chosen soundtrack; the others are only opened when switched to
+    music = Music(discover_tracks(asset_path("soundtrack")))
+    music.play_random(random.Random()) # Own generator, so picking a track leaves the game's random sequence alone
+
+    # The game ticks at a fixed cSpeed per second; frames are drawn at frame_rate (0: uncapped),
+    # between ticks, and skipped rather than slowing the game down when a frame runs long
+    clock = pygame.time.Clock()
+    timestep = FixedTimestep(cSpeed, catch_up)
+    world.interpolate = True
+    hitbox_debugger = HitboxDebugger(surface) # Debug overlay, off until H is pressed
+    # Garbage collection only in the time a frame would otherwise sleep (see memory.py), and
+    # optionally the allocation telemetry for the loop
+    collector = GcPolicy()
+    if gc_policy:
+        collector.start()
+    tracer = AllocationTracer(top=alloc_trace) if alloc_trace else None
+    if tracer is not None:
+        tracer.start()
+    running = True
+
+    while running:
+        frame_start = time.perf_counter()
+        profiler.begin_frame()
+        if tracer is not None:
+            tracer.begin_frame()
+        # Process all events (keyboard, window close, etc.)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False   # Exit loop if window is closed
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_h:
+                    hitbox_debugger.toggle()
+                elif event.key == pygame.K_m:
+                    music.crossfade_to(music.next_number()) # Switch to the next soundtrack
+                elif event.key == pygame.K_F3:
+                    profiler.show_graph = not profiler.show_graph
+        music.update()
+        if not assets.loader.done and assets.loader.poll():
+            renderer.assets_changed() # Finish (convert) what the workers loaded since last frame
+            if assets.loader.done:
+                collector.freeze()
+        if asset_report and assets.loader.done:
+            print(assets.manager.report())
+            asset_report = False
+        profiler.mark("events")
+
+        # Get state of all keys (pressed or not) and advance the game by however many ticks are due
+        keys = pygame.key.get_pressed()
+        for _ in range(timestep.advance()):
+            step_keys = recorder.keys(keys) if recorder is not None else keys # What gets recorded is exactly what the world sees
+            world.step(step_keys)
+            if recorder is not None:
+                recorder.after_step(world)
+            if world.game_over:
+                break
+        assets.effects.update() # Start this frame's sound effects
+
+        # Draw everything and update display
+        renderer.draw(world, timestep.alpha)
+        # Draw hitboxes and the frame graph (for debugging purposes only)
+        hitbox_debugger.draw(world)
+        profiler.draw_graph(surface)
+        if renderer.dirty is not None and (hitbox_debugger.enabled or (profiler.enabled and profiler.show_graph)):
+            renderer.dirty.invalidate() # Overlays are not tracked, so redraw everything
+        profiler.mark("draw")
+
+        if world.game_over:
+            # Game over: show endcard, pause, and quit
+            assets.loader.wait("endcard")
+            renderer.draw_endcard()
+            renderer.present()
+            pygame.time.delay(5000)
+            print("Game Over")
+            running = False
+        else:
+            renderer.present()
+        profiler.mark("display")
+        if tracer is not None:
+            tracer.end_frame()
+        collector.idle(frame_start + 1 / frame_rate if frame_rate else frame_start)
+        profiler.mark("gc")
+        clock.tick(frame_rate)  # FPS
+        profiler.mark("idle")
+        profiler.end_frame()
+
+    if profiler.enabled:
+        print(profiler.report())
+        print(f"{timestep.ticks} ticks, {timestep.dropped_ticks} dropped by the catch-up limit")
+        if Projectile.pool is not None:
+            print("projectile pool: " + ", ".join(f"{name} {value}" for name, value in Projectile.pool.stats().items()))
+        if collector.active:
+            print(collector.report())
+    collector.stop()
+    if tracer is not None:
+        print(tracer.report())
+        tracer.stop()
+    if trace_path is not None:
+        profiler.dump(trace_path)
+    if recorder is not None:
+        recorder.save(record_path)
+        print(f"Recorded {len(recorder.inputs)} ticks to {record_path}")
+    world.close()
+    assets.loader.close()
+    pygame.quit()  # Close window
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=title)
+    parser.add_argument("--entity-store", action="store_true", help="keep projectiles and enemies in NumPy arrays")
+    parser.add_argument("--dirty-rects", action="store_true", help="only update the parts of the screen that changed")
+    parser.add_argument("--profile", action="store_true", help="time each phase of the frame and print percentiles on exit")
+    parser.add_argument("--trace", metavar="PATH", help="also save every frame's phase timings (.csv, .json, or .trace for Chrome tracing)")
+    parser.add_argument("--record", metavar="PATH", help="record the session's input for replay.py")
+    parser.add_argument("--asset-report", action="store_true", help="print how long each asset took to load")
+    parser.add_argument("--fps", type=int, default=render_rate, help=f"frames drawn per second, 0 for uncapped (the game always ticks at {cSpeed} Hz)")
+    parser.add_argument("--max-catch-up", type=int, default=max_catch_up, help="most ticks run in one frame before the game slows down")
+    parser.add_argument("--pixel-perfect", action="store_true", help="only count hits where the sprites' solid pixels touch")
+    parser.add_argument("--no-gc-policy", action="store_true", help="leave garbage collection to Python instead of idle time between frames")
+    parser.add_argument("--alloc-trace", type=int, default=0, metavar="N", help="trace allocations with tracemalloc and print the top N call sites on exit (slow)")
+    args = parser.parse_args()
+    if args.pixel_perfect and args.entity_store:
+        parser.error("--pixel-perfect needs the object World, not --entity-store")
+    main(entity_store=args.entity_store, dirty_rects=args.dirty_rects, profile=args.profile, trace_path=args.trace, record_path=args.record,
+         asset_report=args.asset_report, frame_rate=args.fps, catch_up=args.max_catch_up, gc_policy=not args.no_gc_policy, alloc_trace=args.alloc_trace,
+         pixel_perfect=args.pixel_perfect)
@@ -0,0 +1,41 @@
+import pygame
+
+# Pixel-perfect narrowphase for collisions. The rect test stays in front: only pairs whose rects
+# already overlap get a pygame.mask overlap test, so hits on transparent corners of the plane
+# sprites are rejected without touching every pair. Masks are built once per sprite Surface
+# (each sprite variant, e.g. the player's left and right banking sprites, has its own) and kept.
+class MaskCache:
+    def __init__(self, threshold=127):
+        self.threshold = threshold # Alpha above which a pixel counts as solid
+        self._masks = {} # Surface -> pygame.mask.Mask
+        self.tests = 0 # Mask overlap tests run (rect-overlapping pairs)
+        self.rejected = 0 # Of those, pairs that only touched at transparent pixels
+
+    @classmethod
+    def for_assets(cls, assets):
+        # Cache with the masks for every sprite that takes part in collisions already built
+        cache = cls()
+        cache.prepare(assets.playerMovingForwardSprite, assets.playerMovingLeftSprite, assets.playerMovingRightSprite,
+                      assets.enemySprite, assets.playerBulletSprite, assets.playerMissileSprite, assets.enemyBulletSprite)
+        return cache
+
+    def prepare(self, *sprites):
+        for sprite in sprites:
+            self.mask(sprite)
+
+    def mask(self, sprite):
+        mask = self._masks.get(sprite)
+        if mask is None:
+            mask = self._masks[sprite] = pygame.mask.from_surface(sprite, self.threshold)
+        return mask
+
+    def overlap(self, a, a_rect, b, b_rect):
+        # True if game objects a and b, at rects a_rect and b_rect (which overlap), share a solid pixel
+        self.tests += 1
+        if self.mask(a._sprite).overlap(self.mask(b._sprite), (b_rect.x - a_rect.x, b_rect.y - a_rect.y)) is None:
+            self.rejected += 1
+            return False
+        return True
+
+    def stats(self):
+        return {"masks": len(self._masks), "tests": self.tests, "rejected": self.rejected}
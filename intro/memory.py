@@ -0,0 +1,155 @@
+import fnmatch
+import gc
+import time
+import tracemalloc
+
+# Runtime memory policy for the frame loop. Python's cyclic collector normally runs whenever
+# enough container objects have been allocated, which is at some random point in the middle of
+# a frame. Once loading is done start() moves everything alive into the permanent generation
+# (gc.freeze), so collections no longer walk the assets, and turns automatic collection off.
+# The game then calls idle() each frame just before clock.tick would sleep: the generation
+# CPython would have collected is collected there, if its last measured cost fits in the time
+# left. A frame with no spare time defers it; once force_factor times the gen0 threshold has
+# piled up the due generation is collected anyway, so older generations still get their turn
+# and memory stays bounded with an uncapped frame rate or a machine that never has time spare.
+class GcPolicy:
+    def __init__(self, thresholds=None, force_factor=10):
+        self.thresholds = thresholds if thresholds is not None else gc.get_threshold()
+        self.force_factor = force_factor
+        self.active = False
+        self.collections = [0, 0, 0] # Per generation
+        self.seconds = [0.0, 0.0, 0.0]
+        self.last_cost = [0.0, 0.0, 0.0] # Seconds the last collection of each generation took
+        self.max_pause = 0.0
+        self.deferred = 0 # idle() calls that had a collection due but no time for it
+        self.forced = 0 # Collections run without the time for them
+        self._was_enabled = True
+
+    def start(self):
+        # Call once loading is done: everything alive now lives for the whole game
+        self._was_enabled = gc.isenabled()
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self.active = True
+
+    def freeze(self):
+        # Move objects created since start() (assets that streamed in later) out of the collector's
+        # way. Collect first, as start() does, or any garbage around now would be kept for good
+        if self.active:
+            gc.collect()
+            gc.freeze()
+
+    def stop(self):
+        if not self.active:
+            return
+        gc.unfreeze()
+        if self._was_enabled:
+            gc.enable()
+        self.active = False
+
+    def due(self):
+        # Generation CPython would collect now, or None: the oldest one over its threshold
+        count = gc.get_count()
+        if count[0] < self.thresholds[0]:
+            return None
+        for generation in (2, 1):
+            if count[generation] >= self.thresholds[generation]:
+                return generation
+        return 0
+
+    def idle(self, deadline):
+        # Collect what is due if it fits before deadline (a time.perf_counter() value).
+        # Returns the generation collected, or None
+        if not self.active:
+            return None
+        generation = self.due()
+        if generation is None:
+            return None
+        if time.perf_counter() + self.last_cost[generation] > deadline:
+            if gc.get_count()[0] < self.thresholds[0] * self.force_factor:
+                self.deferred += 1
+                return None
+            self.forced += 1
+        start = time.perf_counter()
+        gc.collect(generation)
+        seconds = time.perf_counter() - start
+        self.collections[generation] += 1
+        self.seconds[generation] += seconds
+        self.last_cost[generation] = seconds
+        self.max_pause = max(self.max_pause, seconds)
+        return generation
+
+    def report(self):
+        collections = ", ".join(f"gen{generation} {count} ({self.seconds[generation] * 1000:.1f} ms)" for generation, count in enumerate(self.collections))
+        return f"gc: {collections}, longest {self.max_pause * 1000:.2f} ms, {self.deferred} deferred, {self.forced} forced"
+
+# Per-frame allocation telemetry from tracemalloc (slow: a debugging aid, not for normal play).
+# Every frame records how far traced memory rose above its starting point (the frame's
+# temporary allocations) and how much it grew by the end. Every sample_every frames snapshots
+# at both ends of the frame are compared: whatever was allocated in the frame and is still
+# alive at its end (new objects, garbage waiting for the collector) is added up by call site
+class AllocationTracer:
+    def __init__(self, top=10, sample_every=30, frames=1):
+        self.top = top
+        self.sample_every = sample_every
+        self.traceback_frames = frames
+        self.frames = 0
+        self.peak_bytes = [] # Per frame: highest traced memory minus where the frame started
+        self.net_bytes = [] # Per frame: traced memory at the end minus at the start
+        self.sites = {} # call site -> [blocks, bytes] alive at the end of sampled frames
+        self._start = 0
+        self._snapshot = None
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+
+    def start(self):
+        for trace_filter in self._filters:
+            fnmatch.fnmatch("", trace_filter.filename_pattern) # Compile (and cache) the patterns before tracing starts
+        tracemalloc.start(self.traceback_frames)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def begin_frame(self):
+        self.frames += 1
+        self._snapshot = None
+        if self.frames % self.sample_every == 0:
+            self._snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+        tracemalloc.reset_peak()
+        self._start = tracemalloc.get_traced_memory()[0]
+
+    def end_frame(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak_bytes.append(peak - self._start)
+        self.net_bytes.append(current - self._start)
+        if self._snapshot is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+            for stat in snapshot.compare_to(self._snapshot, "lineno"):
+                if stat.count_diff > 0:
+                    frame = stat.traceback[0]
+                    site = self.sites.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+                    site[0] += stat.count_diff
+                    site[1] += stat.size_diff
+            self._snapshot = None
+
+    def top_sites(self):
+        # [(site, blocks, bytes), ...] most blocks first
+        ranked = sorted(self.sites.items(), key=lambda item: -item[1][0])
+        return [(site, blocks, size) for site, (blocks, size) in ranked[:self.top]]
+
+    def report(self):
+        frames = len(self.peak_bytes)
+        if not frames:
+            return "allocations: no frames traced"
+        lines = [
+            f"allocations over {frames} frames: temporary {sum(self.peak_bytes) / frames / 1024:.1f} KB/frame mean, "
+            f"{max(self.peak_bytes) / 1024:.1f} KB max; retained {sum(self.net_bytes) / frames / 1024:+.2f} KB/frame mean",
+            f"top call sites of blocks still alive at frame end ({self.frames // self.sample_every} sampled frames):",
+        ]
+        for site, blocks, size in self.top_sites():
+            lines.append(f"{blocks:>8} blocks {size / 1024:>9.1f} KB  {site}")
+        return "\n".join(lines)
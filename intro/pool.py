@@ -0,0 +1,71 @@
+# What acquire() does once `capacity` objects are out and none are free:
+#   "grow"     - build another pooled object and raise the capacity
+#   "allocate" - build a one-off object that is simply dropped when freed
+#   "drop"     - return None, the caller skips spawning
+OVERFLOW_POLICIES = ("grow", "allocate", "drop")
+
+# Reusable pool of game objects, so short-lived projectiles are recycled instead of rebuilt every shot.
+# Objects need a `_pool` and an `_in_pool` attribute (GameObject has both).
+class ObjectPool:
+    def __init__(self, factory, capacity=256, overflow="grow", prefill=0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, not {overflow!r}")
+        self._factory = factory # Builds a blank object, the caller sets it up after acquire()
+        self._free = [] # Objects ready to hand out
+        self.capacity = capacity # Most pooled objects this pool will build
+        self.overflow = overflow
+        self.created = 0 # Pooled objects built so far
+        self.active = 0 # Pooled objects handed out and not yet released
+        self.high_water = 0 # Highest `active` has been
+        self.overflows = 0 # acquire() calls that found the pool exhausted
+        for _ in range(min(prefill, capacity)):
+            obj = self._create()
+            obj._in_pool = True
+            self._free.append(obj)
+
+    def _create(self):
+        obj = self._factory()
+        obj._pool = self
+        self.created += 1
+        return obj
+
+    def acquire(self):
+        # Take a free object, building one if allowed; None only with the "drop" policy
+        if self._free:
+            obj = self._free.pop()
+        elif self.created < self.capacity:
+            obj = self._create()
+        else:
+            self.overflows += 1
+            if self.overflow == "drop":
+                return None
+            if self.overflow == "allocate":
+                obj = self._factory()
+                obj._pool = None
+                return obj
+            self.capacity += 1
+            obj = self._create()
+        obj._in_pool = False
+        self.active += 1
+        if self.active > self.high_water:
+            self.high_water = self.active
+        return obj
+
+    def release(self, obj):
+        # Give an object back; objects from other pools or already released are ignored
+        if obj._pool is not self or obj._in_pool:
+            return
+        obj._in_pool = True
+        self.active -= 1
+        self._free.append(obj)
+
+    def stats(self):
+        # Snapshot of how the pool is being used
+        return {
+            "active": self.active,
+            "free": len(self._free),
+            "high_water": self.high_water,
+            "created": self.created,
+            "capacity": self.capacity,
+            "overflows": self.overflows,
+        }
@@ -0,0 +1,154 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+
+import pygame
+
+# Colours for the on-screen graph, cycled through in the order phases first appear
+GRAPH_COLOURS = [
+    (230, 25, 75), (60, 180, 75), (255, 225, 25), (0, 130, 200), (245, 130, 48), (145, 30, 180),
+    (70, 240, 240), (240, 50, 230), (210, 245, 60), (250, 190, 212), (0, 128, 128), (170, 110, 40),
+    (128, 128, 128), (255, 255, 255),
+]
+
+def percentile(sorted_values, p):
+    # p-th percentile (0-100) of an already sorted list, nearest rank
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# Per-phase frame profiler. Call begin_frame(), then mark("phase") at the end of each phase
+# (the time since the previous mark is charged to it), then end_frame(). Keeps a rolling
+# window of frames for p50/p95/p99 per phase and, with record=True, every frame for dump().
+# While disabled every call returns straight away, so it can stay in the loop for good.
+class FrameProfiler:
+    def __init__(self, enabled=False, window=300, record=False, max_frames=100000):
+        self.enabled = enabled
+        self.record = record # Keep every frame's phases for dump()
+        self.show_graph = True
+        self._window = deque(maxlen=window) # Recent frames as {phase: seconds}
+        self._trace = deque(maxlen=max_frames) # Recorded frames as (start, [(phase, start, seconds), ...])
+        self._phases = [] # Phase names in the order first seen
+        self._frame = None
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._origin = time.perf_counter()
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._frame_start = now
+        self._last = now
+        self._frame = []
+
+    def mark(self, phase):
+        # Charge the time since the last mark to `phase`
+        if not self.enabled or self._frame is None:
+            return
+        now = time.perf_counter()
+        self._frame.append((phase, self._last, now - self._last))
+        self._last = now
+
+    def end_frame(self):
+        if not self.enabled or self._frame is None:
+            return
+        durations = {}
+        for phase, _, seconds in self._frame:
+            durations[phase] = durations.get(phase, 0.0) + seconds
+            if phase not in self._phases:
+                self._phases.append(phase)
+        self._window.append(durations)
+        if self.record:
+            self._trace.append((self._frame_start, self._frame))
+        self._frame = None
+
+    def phases(self):
+        return list(self._phases)
+
+    def summary(self):
+        # {phase: {"p50", "p95", "p99", "mean"}} in milliseconds over the rolling window
+        result = {}
+        for phase in self._phases:
+            values = sorted(frame.get(phase, 0.0) * 1000 for frame in self._window)
+            result[phase] = {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "mean": sum(values) / len(values) if values else 0.0,
+            }
+        return result
+
+    def report(self):
+        # Summary as a printable table
+        lines = [f"{'phase':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+        for phase, stats in self.summary().items():
+            lines.append(f"{phase:<18}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}")
+        return "\n".join(lines)
+
+    def dump(self, path, fmt=None):
+        # Write recorded frames as "csv" (one row per frame), "json" or "chrome" (trace-event file for
+        # chrome://tracing / Perfetto). Without fmt it follows the extension: .csv, .trace, otherwise json
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lower()
+            fmt = {".csv": "csv", ".trace": "chrome"}.get(extension, "json")
+        frames = list(self._trace)
+        if fmt == "csv":
+            with open(path, "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(["frame", "start_ms"] + [f"{phase}_ms" for phase in self._phases])
+                for number, (start, phases) in enumerate(frames):
+                    durations = {}
+                    for phase, _, seconds in phases:
+                        durations[phase] = durations.get(phase, 0.0) + seconds
+                    writer.writerow([number, f"{(start - self._origin) * 1000:.4f}"] + [f"{durations.get(phase, 0.0) * 1000:.4f}" for phase in self._phases])
+        elif fmt == "json":
+            with open(path, "w") as out:
+                json.dump({
+                    "phases": self._phases,
+                    "summary": self.summary(),
+                    "frames": [{"start_ms": (start - self._origin) * 1000, "phases": [[phase, seconds * 1000] for phase, _, seconds in phases]} for start, phases in frames],
+                }, out)
+        elif fmt == "chrome":
+            events = []
+            for number, (start, phases) in enumerate(frames):
+                for phase, phase_start, seconds in phases:
+                    events.append({"name": phase, "ph": "X", "pid": 1, "tid": 1,
+                                   "ts": (phase_start - self._origin) * 1e6, "dur": seconds * 1e6,
+                                   "args": {"frame": number}})
+            with open(path, "w") as out:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, out)
+        else:
+            raise ValueError(f"unknown trace format {fmt!r}")
+
+    def draw_graph(self, surface, x=None, y=None, width=120, height=48, budget_ms=1000 / 60):
+        # Stacked bar per recent frame, one colour per phase; the line marks the frame budget
+        if not self.enabled or not self.show_graph:
+            return
+        if x is None:
+            x = surface.get_width() - width - 5
+        if y is None:
+            y = 5
+        scale = height / (budget_ms * 2) # Budget line sits half way up
+        frames = list(self._window)[-width:]
+        surface.fill((0, 0, 0), (x, y, width, height))
+        colours = {phase: GRAPH_COLOURS[i % len(GRAPH_COLOURS)] for i, phase in enumerate(self._phases)}
+        for column, frame in enumerate(frames):
+            bottom = y + height
+            for phase, seconds in frame.items():
+                bar = int(seconds * 1000 * scale)
+                if bar <= 0:
+                    continue
+                top = max(y, bottom - bar)
+                pygame.draw.line(surface, colours[phase], (x + column, bottom - 1), (x + column, top))
+                bottom = top
+                if bottom <= y:
+                    break
+        budget_y = y + height - int(budget_ms * scale)
+        pygame.draw.line(surface, (255, 255, 255), (x, budget_y), (x + width - 1, budget_y))
+
+# Disabled profiler shared by anything that was not given a real one
+NULL_PROFILER = FrameProfiler(enabled=False)
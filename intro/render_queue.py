@@ -0,0 +1,56 @@
+# Draw layers, lowest drawn first. Gaps leave room to slot new layers in between
+LAYER_BACKGROUND = 0
+LAYER_PLAYER_SHOTS = 10
+LAYER_ENEMIES = 20
+LAYER_ENEMY_SHOTS = 30
+LAYER_EFFECTS = 40
+LAYER_PLAYER = 50
+LAYER_HUD = 60
+
+# Collects (sprite, position) pairs per layer during a frame and submits each layer with a
+# single Surface.blits call, in layer order. Lists are reused between frames.
+class RenderQueue:
+    def __init__(self):
+        self._layers = {} # z -> [(sprite, position), ...]
+        self._order = [] # Layer z values, sorted
+        self.blit_count = 0 # Sprites drawn by the last flush
+        self.blits_calls = 0 # Surface.blits calls made by the last flush
+
+    def _layer(self, z):
+        items = self._layers.get(z)
+        if items is None:
+            items = self._layers[z] = []
+            self._order = sorted(self._layers)
+        return items
+
+    def add(self, z, sprite, position):
+        # Queue one sprite on layer z
+        self._layer(z).append((sprite, position))
+
+    def extend(self, z, items):
+        # Queue many (sprite, position) pairs on layer z
+        self._layer(z).extend(items)
+
+    def flush(self, surface, rects_from=None):
+        # Draw every layer bottom to top, then empty the queue for the next frame.
+        # With rects_from set, returns the screen rects drawn on layers from that z upwards
+        blit_count = 0
+        blits_calls = 0
+        rects = [] if rects_from is not None else None
+        for z in self._order:
+            items = self._layers[z]
+            if items:
+                if rects is not None and z >= rects_from:
+                    rects.extend(surface.blits(items))
+                else:
+                    surface.blits(items, doreturn=False)
+                blit_count += len(items)
+                blits_calls += 1
+                items.clear()
+        self.blit_count = blit_count
+        self.blits_calls = blits_calls
+        return rects
+
+    def stats(self):
+        # Sprites and blits calls for the last frame
+        return {"blits": self.blit_count, "blits_calls": self.blits_calls}
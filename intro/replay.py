@@ -0,0 +1,182 @@
+import argparse
+import random
+import struct
+import sys
+import time
+import zlib
+
+import pygame
+
+from mainfile import Renderer, create_world, key_down
+from profiler import FrameProfiler
+
+# Session recording and replay. A recording is the RNG seed plus one byte of held keys per tick,
+# so a whole session is a few KB. Replaying feeds the same bytes back into a fresh World seeded the
+# same way, which plays out exactly the same game, as fast as the CPU allows. Every hash_interval
+# ticks the recording also stores a hash of the world state, and the replay stops at the first
+# tick whose hash does not match.
+#
+#   python mainfile.py --record session.dsr
+#   python replay.py session.dsr --profile
+
+MAGIC = b"DSRP"
+VERSION = 1
+# Header: magic, version, flags, seed, hash interval, tick count, hash count
+HEADER = struct.Struct("<4sBBQHII")
+HASH = struct.Struct("<II") # (tick, crc32)
+FLAG_ENTITY_STORE = 1
+FLAG_PIXEL_PERFECT = 2
+
+# Input bits, one per action. WASD is stored as the matching arrow
+INPUT_UP = 1
+INPUT_DOWN = 2
+INPUT_LEFT = 4
+INPUT_RIGHT = 8
+INPUT_FIRE = 16
+INPUT_KEYS = [
+    (INPUT_UP, (pygame.K_UP, pygame.K_w), pygame.K_UP),
+    (INPUT_DOWN, (pygame.K_DOWN, pygame.K_s), pygame.K_DOWN),
+    (INPUT_LEFT, (pygame.K_LEFT, pygame.K_a), pygame.K_LEFT),
+    (INPUT_RIGHT, (pygame.K_RIGHT, pygame.K_d), pygame.K_RIGHT),
+    (INPUT_FIRE, (pygame.K_SPACE,), pygame.K_SPACE),
+]
+
+def encode_keys(keys):
+    # Held keys (get_pressed() or a dict) as an input bitmask
+    mask = 0
+    for bit, codes, _ in INPUT_KEYS:
+        if key_down(keys, *codes):
+            mask |= bit
+    return mask
+
+def decode_keys(mask):
+    # Input bitmask back to a dict of held keys that World.step understands
+    return {key: True for bit, _, key in INPUT_KEYS if mask & bit}
+
+def state_hash(world):
+    # Checksum of everything that decides how the game goes on from here
+    player = world.player
+    state = (
+        world.ticks, world.score, world.scheduler.now, world.scheduler.pending(), world.bg_offset,
+        player.getPos(), player.health, player.lives, player._gun_ready, player._missile_ready,
+        [tuple(rect) for rect in world.hitboxes()],
+        [tuple(explosion) for explosion in world.explosions],
+    )
+    return zlib.crc32(repr(state).encode())
+
+# Captures a session while it is played. Call keys(pressed) once per tick and pass what it returns
+# to World.step (so recording and replay see exactly the same input), then after_step(world).
+class InputRecorder:
+    def __init__(self, seed, hash_interval=60, entity_store=False, pixel_perfect=False):
+        self.seed = seed
+        self.hash_interval = hash_interval
+        self.entity_store = entity_store
+        self.pixel_perfect = pixel_perfect
+        self.inputs = bytearray()
+        self.hashes = [] # [(tick, crc32), ...]
+
+    def keys(self, pressed):
+        mask = encode_keys(pressed)
+        self.inputs.append(mask)
+        return decode_keys(mask)
+
+    def after_step(self, world):
+        if self.hash_interval and world.ticks % self.hash_interval == 0:
+            self.hashes.append((world.ticks, state_hash(world)))
+
+    def save(self, path):
+        flags = (FLAG_ENTITY_STORE if self.entity_store else 0) | (FLAG_PIXEL_PERFECT if self.pixel_perfect else 0)
+        with open(path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, flags, self.seed, self.hash_interval, len(self.inputs), len(self.hashes)))
+            out.write(self.inputs)
+            for entry in self.hashes:
+                out.write(HASH.pack(*entry))
+
+# A loaded recording
+class Recording:
+    def __init__(self, seed, inputs, hashes, hash_interval=60, entity_store=False, pixel_perfect=False):
+        self.seed = seed
+        self.inputs = bytes(inputs)
+        self.hashes = list(hashes)
+        self.hash_interval = hash_interval
+        self.entity_store = entity_store
+        self.pixel_perfect = pixel_perfect
+
+    @classmethod
+    def from_recorder(cls, recorder):
+        return cls(recorder.seed, recorder.inputs, recorder.hashes, recorder.hash_interval, recorder.entity_store, recorder.pixel_perfect)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a recording")
+        magic, version, flags, seed, hash_interval, tick_count, hash_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} recording")
+        offset = HEADER.size
+        inputs = data[offset:offset + tick_count]
+        offset += tick_count
+        if len(inputs) != tick_count or len(data) != offset + hash_count * HASH.size:
+            raise ValueError(f"{path} is truncated")
+        hashes = [HASH.unpack_from(data, offset + i * HASH.size) for i in range(hash_count)]
+        return cls(seed, inputs, hashes, hash_interval, bool(flags & FLAG_ENTITY_STORE), bool(flags & FLAG_PIXEL_PERFECT))
+
+def new_seed():
+    # Fresh seed for a recorded session
+    return random.SystemRandom().getrandbits(32)
+
+def play(recording, render=False, headless=True, profiler=None):
+    # Replay a recording with no frame cap. Returns {"world", "ticks", "seconds", "diverged_at"},
+    # where diverged_at is the first tick whose state hash did not match (None if none did)
+    random.seed(recording.seed)
+    surface, assets, world = create_world(headless=headless, entity_store=recording.entity_store, pixel_perfect=recording.pixel_perfect)
+    if profiler is not None:
+        world.profiler = profiler
+    renderer = Renderer(surface, assets) if render else None
+    expected = dict(recording.hashes)
+    mark = world.profiler.mark
+    diverged_at = None
+    start = time.perf_counter()
+    for mask in recording.inputs:
+        world.profiler.begin_frame()
+        world.step(decode_keys(mask))
+        if renderer is not None:
+            renderer.draw(world)
+            mark("draw")
+            renderer.present()
+            mark("display")
+        world.profiler.end_frame()
+        wanted = expected.get(world.ticks)
+        if wanted is not None and state_hash(world) != wanted:
+            diverged_at = world.ticks
+            break
+        if world.game_over:
+            break
+    return {"world": world, "ticks": world.ticks, "seconds": time.perf_counter() - start, "diverged_at": diverged_at}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded Desert Storm session")
+    parser.add_argument("path", help="recording made with mainfile.py --record")
+    parser.add_argument("--render", action="store_true", help="draw every frame as well")
+    parser.add_argument("--window", action="store_true", help="show the replay in a window (implies --render)")
+    parser.add_argument("--profile", action="store_true", help="print per-phase timings at the end")
+    args = parser.parse_args(argv)
+
+    recording = Recording.load(args.path)
+    profiler = FrameProfiler(enabled=True, window=len(recording.inputs) or 1) if args.profile else None
+    result = play(recording, render=args.render or args.window, headless=not args.window, profiler=profiler)
+    ticks_per_second = result["ticks"] / result["seconds"] if result["seconds"] else 0.0
+    print(f"{result['ticks']} of {len(recording.inputs)} ticks in {result['seconds']:.3f}s ({ticks_per_second:.0f} ticks/s), score {result['world'].score}")
+    result["world"].close()
+    if profiler is not None:
+        print(profiler.report())
+    pygame.quit()
+    if result["diverged_at"] is not None:
+        print(f"DIVERGED at tick {result['diverged_at']}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
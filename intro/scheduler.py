@@ -0,0 +1,73 @@
+import heapq
+from itertools import count
+
+# A pending callback; keep it to cancel or reschedule it
+class Timer:
+    __slots__ = ("start", "due", "callback", "args", "active")
+
+    def __init__(self, start, due, callback, args):
+        self.start = start # Scheduler time it was scheduled at
+        self.due = due # Scheduler time it fires at
+        self.callback = callback
+        self.args = args
+        self.active = True # False once fired or cancelled
+
+# Tick-based timers on a binary heap. advance() moves time on by one tick (times scale) and
+# runs every callback that has come due, earliest first and in scheduling order on ties, so
+# only timers that actually fire cost anything. Pausing stops time; a scale below 1 stretches
+# every timer for slow motion. Cancelled timers stay in the heap and are skipped when popped.
+class Scheduler:
+    def __init__(self, scale=1.0):
+        self.now = 0.0
+        self.scale = scale # Scheduler time per tick
+        self.paused = False
+        self.fired = 0 # Callbacks run so far
+        self._heap = [] # (due, order, timer)
+        self._order = count()
+
+    def schedule(self, delay, callback, *args):
+        # Call callback(*args) once `delay` ticks (at scale 1) from now
+        return self._push(Timer(self.now, self.now + delay, callback, args))
+
+    def reschedule(self, timer, delay):
+        # Move a pending timer to `delay` after the time it was first scheduled at. If that has
+        # already passed it fires on the next advance. Returns the new timer
+        timer.active = False
+        return self._push(Timer(timer.start, max(timer.start + delay, self.now), timer.callback, timer.args))
+
+    def cancel(self, timer):
+        timer.active = False
+
+    def remaining(self, timer):
+        # Scheduler time left before the timer fires
+        return max(0.0, timer.due - self.now) if timer.active else 0.0
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def pending(self):
+        # Due times of the timers still waiting, earliest first
+        return [due for due, _, timer in sorted(self._heap) if timer.active]
+
+    def advance(self, ticks=1):
+        # Move time on and run what came due; returns how many callbacks ran
+        if self.paused:
+            return 0
+        self.now += ticks * self.scale
+        heap = self._heap
+        fired = 0
+        while heap and heap[0][0] <= self.now:
+            timer = heapq.heappop(heap)[2]
+            if timer.active:
+                timer.active = False
+                timer.callback(*timer.args)
+                fired += 1
+        self.fired += fired
+        return fired
+
+    def _push(self, timer):
+        heapq.heappush(self._heap, (timer.due, next(self._order), timer))
+        return timer
@@ -0,0 +1,135 @@
+# Uniform grid over the playfield used as a collision broadphase.
+# Objects are inserted under a group name ("bullets", "enemies"...) and a query only returns
+# objects from that group whose grid cells touch the query rect, so the colliderect
+# narrowphase only runs on nearby pairs. Rebuild it (clear + insert_all) whenever positions change.
+class SpatialHash:
+    def __init__(self, width, height, cell_size=32):
+        self.cell_size = cell_size
+        self.cols = max(1, -(-width // cell_size))
+        self.rows = max(1, -(-height // cell_size))
+        self._groups = {} # group name -> {cell index: [(order, obj), ...]}
+        self._removed = set() # ids of objects removed since the last clear
+        self._order = 0 # Insertion counter so queries return objects in list order
+        self.candidates = 0 # Objects returned by all queries so far (not reset by clear)
+
+    def clear(self):
+        # Forget everything, ready for a rebuild
+        self._groups.clear()
+        self._removed.clear()
+        self._order = 0
+
+    def _cells(self, rect):
+        # Flat indices of every cell the rect touches. Objects off the playfield go in the edge cells
+        cs = self.cell_size
+        last_col = self.cols - 1
+        last_row = self.rows - 1
+        x0 = min(max(rect.left // cs, 0), last_col)
+        x1 = min(max((rect.right - 1) // cs, 0), last_col)
+        y0 = min(max(rect.top // cs, 0), last_row)
+        y1 = min(max((rect.bottom - 1) // cs, 0), last_row)
+        cols = self.cols
+        return [row * cols + col for row in range(y0, y1 + 1) for col in range(x0, x1 + 1)]
+
+    def insert(self, group, obj, rect=None):
+        # Add one object to a group, filed under every cell its rect (obj.get_rect() by default) covers
+        cells = self._groups.setdefault(group, {})
+        entry = (self._order, obj)
+        self._order += 1
+        for index in self._cells(obj.get_rect() if rect is None else rect):
+            bucket = cells.get(index)
+            if bucket is None:
+                cells[index] = [entry]
+            else:
+                bucket.append(entry)
+
+    def insert_all(self, group, objects):
+        # Add a whole list of objects to a group
+        for obj in objects:
+            self.insert(group, obj)
+
+    def remove(self, obj):
+        # Stop returning obj from queries (e.g. a bullet that already hit something)
+        self._removed.add(id(obj))
+
+    def query(self, group, rect):
+        # Objects in the group that share a cell with rect, in the order they were inserted
+        cells = self._groups.get(group)
+        if not cells:
+            return []
+        found = {}
+        for index in self._cells(rect):
+            bucket = cells.get(index)
+            if bucket:
+                for order, obj in bucket:
+                    found[order] = obj
+        removed = self._removed
+        result = [found[order] for order in sorted(found) if id(found[order]) not in removed]
+        self.candidates += len(result)
+        return result
+
+    def occupied_cells(self):
+        # (row, col) of every cell holding at least one object, in any group
+        occupied = set()
+        for cells in self._groups.values():
+            occupied.update(index for index, bucket in cells.items() if bucket)
+        return sorted(divmod(index, self.cols) for index in occupied)
+
+# Nearest-neighbour index over points (enemy centres), built once per tick.
+# Points are bucketed into square cells and a query searches rings of cells outwards from
+# the query point, stopping once no unsearched cell can hold anything closer.
+# Ties go to the point added first, the same as min() over the original list.
+class TargetIndex:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self._cells = {} # (col, row) -> [(order, x, y, target), ...]
+        self._count = 0
+        self._min_col = self._max_col = self._min_row = self._max_row = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, x, y, target):
+        # Index target at point (x, y)
+        cs = self.cell_size
+        col, row = x // cs, y // cs
+        if self._count == 0:
+            self._min_col = self._max_col = col
+            self._min_row = self._max_row = row
+        else:
+            self._min_col = min(self._min_col, col)
+            self._max_col = max(self._max_col, col)
+            self._min_row = min(self._min_row, row)
+            self._max_row = max(self._max_row, row)
+        self._cells.setdefault((col, row), []).append((self._count, x, y, target))
+        self._count += 1
+
+    def nearest(self, x, y):
+        # The target closest to (x, y), or None if the index is empty
+        if self._count == 0:
+            return None
+        cs = self.cell_size
+        cells = self._cells
+        col, row = x // cs, y // cs
+        # Furthest ring that can still hold an indexed cell
+        last_ring = max(col - self._min_col, self._max_col - col, row - self._min_row, self._max_row - row)
+        best = None # (distance squared, order, target)
+        for ring in range(last_ring + 1):
+            for ring_col in range(col - ring, col + ring + 1):
+                edge = ring_col == col - ring or ring_col == col + ring
+                rows = range(row - ring, row + ring + 1) if edge else (row - ring, row + ring)
+                for ring_row in rows:
+                    bucket = cells.get((ring_col, ring_row))
+                    if not bucket:
+                        continue
+                    for order, tx, ty, target in bucket:
+                        d2 = (tx - x) ** 2 + (ty - y) ** 2
+                        if best is None or (d2, order) < best[:2]:
+                            best = (d2, order, target)
+            # Anything in the next ring is at least ring * cell_size away
+            if best is not None and best[0] < (ring * cs) ** 2:
+                break
+        return best[2]
+
+    def nearest_many(self, points):
+        # Batched nearest(): one target (or None) per (x, y) point
+        return [self.nearest(x, y) for x, y in points]
@@ -1,9 +1,18 @@
+import os
+import random
 import unittest
 import pygame
 import math
-from mainfile import GameObject, Player, Projectile, Enemy, spawn_explosion_at_object
+from mainfile import GameObject, Player, Projectile, Enemy, World, Assets, spawn_explosion_at_object
+from spatial import SpatialHash, TargetIndex
+from pool import ObjectPool
+from hud import Hud
+from audio import Music, discover_tracks
+from render_queue import RenderQueue
 
-# Mock Pygame init for headless testing
+# Mock Pygame init for headless testing (dummy drivers so no window or sound card is needed)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
 pygame.init()
 screen = pygame.display.set_mode((320, 480))
 mock_sprite = pygame.Surface((10, 10))
@@ -22,6 +31,16 @@ class TestGameObject(unittest.TestCase):
         self.assertEqual(rect.width, 10)
         self.assertEqual(rect.height, 10)
 
+    def test_rect_is_kept_and_moved(self): # one Rect per object, moved in place and resized with the sprite
+        obj = Projectile(screen, mock_sprite, 50, 60)
+        rect = obj.get_rect()
+        obj.Movement()
+        self.assertIs(obj.get_rect(), rect)
+        self.assertEqual(rect.topleft, (50, 50))
+        obj.set_sprite(pygame.Surface((4, 8)))
+        self.assertEqual(obj.get_rect().size, (4, 8))
+        self.assertFalse(hasattr(obj, "__dict__"))
+
 # verify movement logic
 class TestProjectile(unittest.TestCase):
     def test_projectile_movement_up(self): 
@@ -102,6 +121,847 @@ class TestMissileHoming(unittest.TestCase):
         missile._xPos += dx_capped
         self.assertTrue(abs(missile.getXPos() - enemy.getXPos()) <= missile_homing_speed)
 
+### Headless World simulation ###
+class TestWorld(unittest.TestCase):
+    def setUp(self):
+        self.assets = Assets(headless=True)
+        self.world = World(screen, self.assets)
+
+    def test_step_advances_state(self): # bullets are fired and the background scrolls each tick
+        for _ in range(10):
+            self.world.step({})
+        self.assertEqual(self.world.ticks, 10)
+        self.assertEqual(self.world.bg_offset, 10)
+        self.assertTrue(len(self.world.bullets) >= 1)
+
+    def test_enemies_spawn(self): # spawn timer adds 1.3 a tick so an enemy appears by tick 31
+        for _ in range(31):
+            self.world.step({})
+        self.assertTrue(len(self.world.enemies) >= 1)
+
+    def test_held_keys_move_player(self): # a plain dict of held keys drives the player
+        start_x = self.world.player.getXPos()
+        self.world.step({pygame.K_LEFT: True})
+        self.assertEqual(self.world.player.getXPos(), start_x - 5)
+
+    def test_game_over_flag(self): # losing the last life ends the game without blocking
+        self.world.player.lives = 1
+        self.world.player.update_health(-3, self.world.explosions, self.assets.explosionSprite, 30, self.assets.explosionSound)
+        self.world.step({})
+        self.assertTrue(self.world.game_over)
+
+### Spatial hash broadphase ###
+class TestSpatialHash(unittest.TestCase):
+    def setUp(self):
+        self.grid = SpatialHash(320, 480, cell_size=32)
+
+    def test_query_returns_nearby_in_order(self): # only objects near the rect come back, in insertion order
+        near = [Projectile(screen, mock_sprite, 100 + i, 100) for i in range(3)]
+        far = Projectile(screen, mock_sprite, 300, 400)
+        self.grid.insert_all("bullets", near + [far])
+        self.assertEqual(self.grid.query("bullets", pygame.Rect(95, 95, 10, 10)), near)
+        self.assertEqual(self.grid.query("missiles", pygame.Rect(95, 95, 10, 10)), [])
+
+    def test_removed_and_offscreen(self): # removed objects vanish, off-screen ones land in the edge cells
+        bullet = Projectile(screen, mock_sprite, 50, -20)
+        self.grid.insert("bullets", bullet)
+        self.assertEqual(self.grid.query("bullets", pygame.Rect(50, -15, 5, 5)), [bullet])
+        self.grid.remove(bullet)
+        self.assertEqual(self.grid.query("bullets", pygame.Rect(50, -15, 5, 5)), [])
+
+    def test_enemy_collision_with_grid(self): # same hit and score as without the broadphase
+        enemy = Enemy(screen, mock_sprite, 100, 100)
+        enemies = [enemy]
+        bullets = [Projectile(screen, mock_sprite, 0, 0), Projectile(screen, mock_sprite, 105, 105)]
+        self.grid.insert_all("bullets", bullets)
+        score_ref = [0]
+        enemy.handle_collisions(enemies, [], bullets, mock_sprite, [], 30, pygame.mixer.Sound(buffer=b"\x00\x00"), score_ref, self.grid)
+        self.assertEqual(enemies, [])
+        self.assertEqual(len(bullets), 1)
+        self.assertEqual(score_ref[0], 1)
+
+    def test_world_matches_brute_force(self): # a seeded crowded session plays out the same with and without the grid
+        import mainfile
+        from unittest import mock
+        results = []
+        for broadphase in (False, True):
+            random.seed(7)
+            world = World(screen, Assets(headless=True), broadphase=broadphase)
+            for k in range(400):
+                world.bullets.append(Projectile(screen, mock_sprite, (k * 37) % 310, 200 + (k * 11) % 270))
+            with mock.patch.object(mainfile, "broadphase_min_pairs", 0): # use the grid on every tick
+                for i in range(300):
+                    world.step({pygame.K_SPACE: True, (pygame.K_LEFT if (i // 40) % 2 else pygame.K_RIGHT): True})
+            results.append((world.score, world.player.lives, world.player.health, len(world.bullets), len(world.enemies)))
+        self.assertEqual(results[0], results[1])
+class TestTargetIndex(unittest.TestCase):
+    def test_matches_min_over_all(self): # same answer as min(..., key=math.hypot) including ties
+        rng = random.Random(3)
+        points = [(rng.randint(-20, 340), rng.randint(-40, 500)) for _ in range(60)] + [(100, 100), (100, 100)]
+        index = TargetIndex(cell_size=48)
+        for i, (x, y) in enumerate(points):
+            index.add(x, y, i)
+        for _ in range(300):
+            qx, qy = rng.randint(-50, 370), rng.randint(-50, 530)
+            expected = min(range(len(points)), key=lambda i: math.hypot(points[i][0] - qx, points[i][1] - qy))
+            self.assertEqual(index.nearest(qx, qy), expected)
+
+    def test_empty(self):
+        self.assertEqual(TargetIndex().nearest_many([(1, 2)]), [None])
+
+    def test_world_homing_capped(self): # missile steers towards the enemy above it by at most the homing speed
+        world = World(screen, Assets(headless=True))
+        missile = Projectile(screen, world._assets.playerMissileSprite, 100, 300)
+        world.missiles.append(missile)
+        world.enemies.append(Enemy(screen, world._assets.enemySprite, 200, 50))
+        world.update_missiles()
+        self.assertEqual(missile.getXPos(), 108)
+        self.assertEqual(missile.getYPos(), 290)
+
+### Projectile pool ###
+class TestObjectPool(unittest.TestCase):
+    def make_pool(self, capacity, overflow="grow"):
+        return ObjectPool(lambda: Projectile(None, None, 0, 0), capacity=capacity, overflow=overflow)
+
+    def test_acquire_release_reuses(self): # a released object is handed out again
+        pool = self.make_pool(4)
+        first = pool.acquire()
+        first.free()
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(pool.stats()["created"], 1)
+
+    def test_stats_and_double_release(self): # counts active, free and high-water, ignoring a second free()
+        pool = self.make_pool(4)
+        objs = [pool.acquire() for _ in range(3)]
+        objs[0].free()
+        objs[0].free()
+        stats = pool.stats()
+        self.assertEqual((stats["active"], stats["free"], stats["high_water"]), (2, 1, 3))
+
+    def test_overflow_policies(self):
+        drop = self.make_pool(1, "drop")
+        drop.acquire()
+        self.assertIsNone(drop.acquire())
+        allocate = self.make_pool(1, "allocate")
+        allocate.acquire()
+        extra = allocate.acquire()
+        extra.free()
+        self.assertEqual(allocate.stats()["free"], 0)
+        grow = self.make_pool(1, "grow")
+        grow.acquire()
+        grow.acquire()
+        self.assertEqual(grow.stats()["capacity"], 2)
+        self.assertEqual(grow.stats()["overflows"], 1)
+        with self.assertRaises(ValueError):
+            self.make_pool(1, "explode")
+
+    def test_shoot_uses_pool(self): # shoot() keeps its signature but recycles bullets through Projectile.pool
+        from unittest import mock
+        pool = self.make_pool(8)
+        from scheduler import Scheduler
+        scheduler = Scheduler() # Re-arms the gun, advanced once per tick as World.step does
+        player = Player(screen, mock_sprite, mock_sprite, mock_sprite, 100, 400, scheduler=scheduler)
+        bullets = []
+        with mock.patch.object(Projectile, "pool", pool):
+            for _ in range(16):
+                scheduler.advance()
+                player.shoot({}, bullets, mock_sprite, 4, pygame.mixer.Sound(buffer=b"\x00\x00"))
+        self.assertEqual(len(bullets), 2)
+        self.assertEqual(pool.stats()["active"], 2)
+
+    def test_closed_worlds_give_projectiles_back(self): # games played one after another reuse the same pooled bullets
+        from unittest import mock
+        pool = self.make_pool(8)
+        assets = Assets(headless=True)
+        with mock.patch.object(Projectile, "pool", pool):
+            for _ in range(3):
+                world = World(screen, assets)
+                for tick in range(60):
+                    world.step({pygame.K_SPACE: tick % 2 == 0})
+                self.assertGreater(pool.stats()["active"], 0)
+                world.close()
+                self.assertEqual(pool.stats()["active"], 0)
+                self.assertEqual((len(world.bullets), len(world.missiles), len(world.enemyBullets)), (0, 0, 0))
+        self.assertLessEqual(pool.stats()["created"], pool.stats()["high_water"])
+
+### Cached HUD ###
+class TestHud(unittest.TestCase):
+    def setUp(self):
+        pygame.font.init()
+        self.font = pygame.font.Font(None, 28)
+
+    def test_renders_only_on_change(self): # unchanged values come from the cache
+        hud = Hud(self.font)
+        for _ in range(10):
+            hud.draw(screen, 3, 3, 0)
+        hud.draw(screen, 3, 3, 1)
+        self.assertEqual(hud.stats(), {"render_calls": 4, "cache_hits": 29})
+
+    def test_glyph_atlas_composes_numbers(self): # score changes reuse pre-rendered digits
+        hud = Hud(self.font, use_glyph_atlas=True)
+        first = hud.text("Score", 7)
+        calls = hud.render_calls
+        second = hud.text("Score", 1234)
+        self.assertEqual(hud.render_calls, calls)
+        self.assertGreater(second.get_width(), first.get_width())
+        self.assertEqual(second.get_height(), self.font.render("Score: 1234", True, (255, 255, 255)).get_height())
+
+### Streamed soundtrack ###
+class RecordingMusic: # stands in for pygame.mixer.music and records what it was asked to do
+    def __init__(self):
+        self.calls = []
+
+    def load(self, path):
+        self.calls.append(("load", path))
+
+    def set_volume(self, volume):
+        self.calls.append(("volume", round(volume, 2)))
+
+    def play(self, loops, fade_ms=0):
+        self.calls.append(("play", loops, fade_ms))
+
+    def stop(self):
+        self.calls.append(("stop",))
+
+class TestMusic(unittest.TestCase):
+    def test_discovers_only_existing_tracks(self):
+        tracks = discover_tracks(os.path.join(os.path.dirname(os.path.abspath(__file__)), "soundtrack"))
+        self.assertTrue(tracks)
+        self.assertTrue(all(os.path.exists(path) for path in tracks.values()))
+
+    def test_loads_one_track_at_a_time(self): # only the chosen track is opened
+        backend = RecordingMusic()
+        music = Music({3: "three.mp3", 4: "four.mp3"}, backend=backend)
+        music.play(4)
+        self.assertEqual([call for call in backend.calls if call[0] == "load"], [("load", "four.mp3")])
+        self.assertEqual(music.next_number(), 3)
+
+    def test_crossfade_without_blocking(self): # volume ramps down over update() calls, then the next track fades in
+        backend = RecordingMusic()
+        music = Music({3: "three.mp3", 4: "four.mp3"}, volume=0.6, backend=backend)
+        music.play(3)
+        music.crossfade_to(4, fade_ms=1000, now_ms=0)
+        music.update(now_ms=250)
+        self.assertEqual(backend.calls[-1], ("volume", 0.3))
+        self.assertEqual(music.current, 3)
+        music.update(now_ms=500)
+        self.assertEqual(music.current, 4)
+        self.assertEqual(backend.calls[-1], ("play", -1, 500))
+
+class TestSoundEffects(unittest.TestCase):
+    def make(self, voices=8, busy_plays=0):
+        from audio import SoundEffects, SilentMixer
+        self.mixer = SilentMixer(busy_plays)
+        effects = SoundEffects(voices=voices, reserved=1, backend=self.mixer)
+        return effects
+
+    def test_same_frame_plays_coalesce_into_one_louder_voice(self):
+        effects = self.make()
+        explosion = effects.add("explosion", None, volume=0.1)
+        for _ in range(10):
+            explosion.play()
+        effects.update(now_ms=0)
+        plays = self.mixer.Channel(1).plays
+        self.assertEqual(len(plays), 1)
+        self.assertAlmostEqual(plays[0][1], 0.3) # 0.1 boosted by sqrt(10), capped at 3x
+        self.assertEqual((effects.stats()["played"], effects.stats()["coalesced"]), (1, 9))
+
+    def test_rate_limit_and_voice_limit(self):
+        effects = self.make(voices=2, busy_plays=100) # Every voice stays busy once used
+        gunshot = effects.add("gunshot", None, min_interval_ms=50)
+        life = effects.add("lose_life", None, priority=True)
+        for now_ms in (0, 20, 60, 200):
+            gunshot.play()
+            effects.update(now_ms)
+        self.assertEqual(effects.stats()["dropped_rate_limited"], 1) # 20 ms after the first
+        self.assertEqual(effects.stats()["dropped_no_voice"], 1) # Third play, both voices busy
+        life.play()
+        effects.update(300)
+        self.assertEqual(self.mixer.Channel(0).plays, [("lose_life", 1.0)]) # Reserved channel still free
+        self.assertEqual((self.mixer.num_channels, self.mixer.reserved), (3, 1))
+
+### Render queue ###
+class TestRenderQueue(unittest.TestCase):
+    def test_layers_drawn_in_z_order(self): # higher layers end up on top whatever order they were queued in
+        target = pygame.Surface((4, 4))
+        red = pygame.Surface((4, 4))
+        red.fill((255, 0, 0))
+        blue = pygame.Surface((4, 4))
+        blue.fill((0, 0, 255))
+        queue = RenderQueue()
+        queue.add(5, blue, (0, 0))
+        queue.add(1, red, (0, 0))
+        queue.flush(target)
+        self.assertEqual(target.get_at((0, 0))[:3], (0, 0, 255))
+        self.assertEqual(queue.stats(), {"blits": 2, "blits_calls": 2})
+
+    def test_frame_blit_count(self): # one blits call per non-empty layer, counts reset every frame
+        from mainfile import Renderer
+        assets = Assets(headless=True)
+        world = World(screen, assets)
+        renderer = Renderer(screen, assets)
+        for _ in range(20):
+            world.step({})
+        renderer.draw(world)
+        sprites = 2 + len(world.bullets) + len(world.missiles) + len(world.enemies) + len(world.enemyBullets) + len(world.explosions) + 1 + 3
+        self.assertEqual(renderer.queue.blit_count, sprites)
+        renderer.draw(world)
+        self.assertEqual(renderer.queue.blit_count, sprites)
+
+class TestDirtyRects(unittest.TestCase):
+    def test_matches_full_redraw(self): # the partially redrawn screen looks the same as a full redraw
+        from mainfile import Renderer
+        assets = Assets(headless=True)
+        random.seed(2)
+        world = World(screen, assets)
+        renderer = Renderer(screen, assets, dirty_rects=True)
+        for _ in range(45):
+            world.step({pygame.K_LEFT: True})
+            renderer.draw(world)
+            renderer.present()
+        partial = pygame.image.tostring(screen, "RGB")
+        self.assertGreater(renderer.dirty.partial_updates, renderer.dirty.full_updates)
+
+        world.bg_offset = world.bg_offset // renderer.dirty.scroll_step * renderer.dirty.scroll_step
+        Renderer(screen, assets).draw(world)
+        self.assertEqual(pygame.image.tostring(screen, "RGB"), partial)
+
+    def test_falls_back_to_full_update(self): # too much dirty area means a full update
+        from dirty_rects import DirtyRects
+        dirty = DirtyRects(pygame.Surface((320, 480)), (320, 480), max_dirty_fraction=0.1)
+        dirty.background_items(0)
+        dirty.present()
+        dirty.background_items(1)
+        dirty.frame_drawn([pygame.Rect(0, 0, 320, 200)])
+        dirty.present()
+        self.assertEqual(dirty.stats()["full_updates"], 2)
+
+### Debug overlay ###
+class TestHitboxDebugger(unittest.TestCase):
+    def setUp(self):
+        from debug_tools import HitboxDebugger
+        self.assets = Assets(headless=True)
+        self.world = World(screen, self.assets)
+        for _ in range(40):
+            self.world.step({})
+        self.debugger = HitboxDebugger(screen)
+
+    def test_off_draws_nothing(self): # the overlay costs nothing until toggled on
+        screen.fill((0, 0, 0))
+        before = pygame.image.tostring(screen, "RGB")
+        self.debugger.draw(self.world)
+        self.assertEqual(pygame.image.tostring(screen, "RGB"), before)
+
+    def test_on_outlines_hitboxes(self):
+        screen.fill((0, 0, 0))
+        self.debugger.toggle()
+        self.debugger.draw(self.world)
+        player_rect = self.world.player.get_rect()
+        self.assertEqual(screen.get_at(player_rect.topleft)[:3], (255, 0, 0))
+
+    def test_collision_test_count(self): # brute force counts every enemy/projectile pair it tests
+        self.world.grid = None
+        self.world.step({})
+        enemies = len(self.world.enemies)
+        self.assertGreaterEqual(self.world.collision_tests, enemies)
+        self.assertEqual(self.world.entity_counts()["enemies"], enemies)
+
+### Frame profiler ###
+class TestFrameProfiler(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        from profiler import FrameProfiler
+        profiler = FrameProfiler()
+        profiler.begin_frame()
+        profiler.mark("events")
+        profiler.end_frame()
+        self.assertEqual(profiler.summary(), {})
+
+    def test_world_phases_and_percentiles(self): # every phase of World.step shows up with ordered percentiles
+        from profiler import FrameProfiler
+        profiler = FrameProfiler(enabled=True, record=True)
+        world = World(screen, Assets(headless=True), profiler=profiler)
+        for _ in range(50):
+            profiler.begin_frame()
+            world.step({})
+            profiler.end_frame()
+        summary = profiler.summary()
+        self.assertEqual(list(summary), ["timers", "movement", "player_collisions", "shooting", "bullets", "missile_homing", "enemies"])
+        for stats in summary.values():
+            self.assertLessEqual(stats["p50"], stats["p95"])
+            self.assertLessEqual(stats["p95"], stats["p99"])
+
+    def test_dump_formats(self):
+        import json, tempfile
+        from profiler import FrameProfiler
+        profiler = FrameProfiler(enabled=True, record=True)
+        for _ in range(3):
+            profiler.begin_frame()
+            profiler.mark("events")
+            profiler.mark("draw")
+            profiler.end_frame()
+        with tempfile.TemporaryDirectory() as folder:
+            profiler.dump(os.path.join(folder, "frames.csv"))
+            with open(os.path.join(folder, "frames.csv")) as f:
+                self.assertEqual(len(f.read().splitlines()), 4)
+            profiler.dump(os.path.join(folder, "frames.trace"))
+            with open(os.path.join(folder, "frames.trace")) as f:
+                events = json.load(f)["traceEvents"]
+            self.assertEqual(len(events), 6)
+            self.assertEqual(events[0]["ph"], "X")
+            profiler.dump(os.path.join(folder, "frames.json"))
+            with open(os.path.join(folder, "frames.json")) as f:
+                self.assertEqual(len(json.load(f)["frames"]), 3)
+
+### Benchmarks ###
+class TestBenchmark(unittest.TestCase):
+    def test_scenario_is_deterministic(self): # same seed, same game: score and entity counts match
+        import benchmark
+        first = benchmark.run_all(["dense_waves"], ticks=60, seed=3, render=False)["dense_waves"]
+        second = benchmark.run_all(["dense_waves"], ticks=60, seed=3, render=False)["dense_waves"]
+        self.assertEqual((first["score"], first["entities"]), (second["score"], second["entities"]))
+        self.assertGreater(first["ticks_per_second"], 0)
+
+    def test_compare_flags_regressions(self):
+        import benchmark
+        baseline = {"idle_flight": {"ticks_per_second": 1000.0, "peak_kb": 100.0}}
+        self.assertEqual(benchmark.compare({"idle_flight": {"ticks_per_second": 950.0, "peak_kb": 105.0}}, baseline, 10), [])
+        self.assertEqual(len(benchmark.compare({"idle_flight": {"ticks_per_second": 850.0, "peak_kb": 120.0}}, baseline, 10)), 2)
+
+    def test_entity_microbenchmark(self):
+        import benchmark
+        results = benchmark.entity_microbenchmark(count=100, pairs=(5, 10), repeat=1)
+        self.assertEqual(set(results), {"dict", "slots"})
+        for result in results.values():
+            self.assertGreater(result["bytes_per_entity"], 0)
+            self.assertGreater(result["pair_tests_per_second"], 0)
+
+### Recording and replay ###
+class TestReplay(unittest.TestCase):
+    def record(self, seed, ticks, entity_store=False):
+        # Play a scripted session through an InputRecorder, as main() does
+        from mainfile import create_world
+        from replay import InputRecorder, Recording
+        recorder = InputRecorder(seed, hash_interval=10, entity_store=entity_store)
+        random.seed(seed)
+        _, _, world = create_world(headless=True, entity_store=entity_store)
+        for tick in range(ticks):
+            pressed = {pygame.K_SPACE: tick % 3 == 0, (pygame.K_a if tick % 50 < 25 else pygame.K_d): True}
+            world.step(recorder.keys(pressed))
+            recorder.after_step(world)
+            if world.game_over:
+                break
+        return Recording.from_recorder(recorder), world
+
+    def test_keys_round_trip(self):
+        from replay import encode_keys, decode_keys, INPUT_LEFT, INPUT_FIRE
+        self.assertEqual(encode_keys({pygame.K_a: True, pygame.K_SPACE: True}), INPUT_LEFT | INPUT_FIRE)
+        self.assertEqual(decode_keys(INPUT_LEFT | INPUT_FIRE), {pygame.K_LEFT: True, pygame.K_SPACE: True})
+
+    def test_replay_matches_recording(self):
+        import tempfile
+        from replay import Recording, play, InputRecorder, HEADER
+        recording, recorded = self.record(7, 200)
+        recorder = InputRecorder(recording.seed, recording.hash_interval)
+        recorder.inputs, recorder.hashes = bytearray(recording.inputs), recording.hashes
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "session.dsr")
+            recorder.save(path)
+            self.assertEqual(os.path.getsize(path), HEADER.size + len(recording.inputs) + len(recording.hashes) * 8) # a byte per tick, 8 per hash
+            loaded = Recording.load(path)
+        self.assertEqual((loaded.seed, loaded.inputs, loaded.hashes), (recording.seed, recording.inputs, recording.hashes))
+        result = play(loaded)
+        self.assertIsNone(result["diverged_at"])
+        self.assertEqual((result["ticks"], result["world"].score), (recorded.ticks, recorded.score))
+
+    def test_entity_store_replay(self):
+        from replay import play
+        recording, recorded = self.record(11, 120, entity_store=True)
+        result = play(recording)
+        self.assertIsNone(result["diverged_at"])
+        self.assertEqual((result["ticks"], result["world"].score), (recorded.ticks, recorded.score))
+
+    def test_divergence_is_reported(self):
+        from replay import play
+        recording, _ = self.record(5, 100)
+        recording.seed += 1 # A different seed spawns enemies elsewhere
+        self.assertIsNotNone(play(recording)["diverged_at"])
+
+### Batch runner ###
+class TestBatch(unittest.TestCase):
+    def test_sweep_jobs_share_seeds(self):
+        import batch
+        jobs = batch.make_jobs(3, {"enemy_spawn_delay": [20, 40], "missile_delay": [60]}, max_ticks=10)
+        self.assertEqual(len(jobs), 6)
+        self.assertEqual([job["seed"] for job in jobs], [0, 1, 2, 0, 1, 2])
+        self.assertEqual(jobs[3]["tunables"], {"enemy_spawn_delay": 40, "missile_delay": 60})
+
+    def test_sessions_are_repeatable_and_summarised(self):
+        import batch
+        jobs = batch.make_jobs(2, {"enemy_spawn_delay": [10]}, pilot="dodge", max_ticks=300)
+        first = batch.run_batch(jobs, workers=1)
+        second = batch.run_batch(jobs, workers=1)
+        self.assertEqual([(r["ticks"], r["score"], r["peaks"]) for r in first], [(r["ticks"], r["score"], r["peaks"]) for r in second])
+        summary, = batch.summarise(first).values()
+        self.assertEqual(summary["sessions"], 2)
+        self.assertGreater(summary["peaks"]["enemies"], 0)
+        self.assertLessEqual(summary["score"]["min"], summary["score"]["max"])
+
+### Timer scheduler ###
+class TestScheduler(unittest.TestCase):
+    def test_fires_in_due_order(self): # earliest first, ties in the order they were scheduled
+        from scheduler import Scheduler
+        scheduler = Scheduler()
+        fired = []
+        for name, delay in (("c", 3), ("a", 1), ("b", 3)):
+            scheduler.schedule(delay, fired.append, name)
+        scheduler.advance()
+        self.assertEqual(fired, ["a"])
+        scheduler.advance(2)
+        self.assertEqual(fired, ["a", "c", "b"])
+
+    def test_cancel_reschedule_pause_and_scale(self):
+        from scheduler import Scheduler
+        scheduler = Scheduler()
+        fired = []
+        cancelled = scheduler.schedule(1, fired.append, "cancelled")
+        scheduler.cancel(cancelled)
+        moved = scheduler.reschedule(scheduler.schedule(10, fired.append, "moved"), 2) # 2 after it was scheduled
+        scheduler.pause()
+        scheduler.advance(5)
+        self.assertEqual((fired, scheduler.now), ([], 0.0))
+        scheduler.resume()
+        scheduler.scale = 0.5 # Slow motion: 4 ticks to cover 2
+        for _ in range(3):
+            scheduler.advance()
+        self.assertEqual(scheduler.remaining(moved), 0.5)
+        scheduler.advance()
+        self.assertEqual(fired, ["moved"])
+
+    def test_world_timers(self): # spawns still come every 31 ticks, explosions go after explosion_time, pausing holds both
+        world = World(screen, Assets(headless=True))
+        for _ in range(30):
+            world.step({})
+        self.assertEqual(len(world.enemies), 0)
+        world.step({})
+        self.assertEqual(len(world.enemies), 1)
+        world.explosions.append([0, 0, 3])
+        world.scheduler.pause()
+        for _ in range(40):
+            world.step({})
+        self.assertEqual((len(world.enemies), len(world.explosions)), (1, 1))
+        world.scheduler.resume()
+        for _ in range(3):
+            world.step({})
+        self.assertEqual(len(world.explosions), 0)
+
+### Explosion effects ###
+class TestEffects(unittest.TestCase):
+    def setUp(self):
+        from effects import explosion_frames
+        from scheduler import Scheduler
+        image = pygame.Surface((128, 128), pygame.SRCALPHA)
+        image.fill((255, 128, 0, 255))
+        self.frames = explosion_frames(image, 32, count=4)
+        self.scheduler = Scheduler()
+
+    def test_frames_grow_and_fade(self):
+        sizes = [frame.get_width() for frame, _ in self.frames]
+        self.assertEqual(sizes, sorted(sizes))
+        first, last = self.frames[0][0], self.frames[-1][0]
+        self.assertGreater(first.get_at((first.get_width() // 2,) * 2).a, last.get_at((last.get_width() // 2,) * 2).a)
+        for frame, (dx, dy) in self.frames: # Centred on the 32x32 footprint
+            self.assertLessEqual(abs(32 - (dx * 2 + frame.get_width())), 1)
+
+    def test_ring_buffer_expires_and_stays_bounded(self):
+        from effects import EffectBuffer
+        effects = EffectBuffer(self.scheduler, self.frames, capacity=3)
+        for x in range(5):
+            effects.add(x, 0, 4)
+        self.assertEqual([x for x, _, _ in effects], [2, 3, 4]) # Oldest two overwritten
+        self.assertEqual(effects.stats()["dropped"], 2)
+        self.assertEqual(effects.blit_sequence()[0][0], self.frames[0][0])
+        self.scheduler.advance(3)
+        self.assertIs(effects.blit_sequence()[0][0], self.frames[3][0]) # 3 of 4 ticks through: last frame
+        self.scheduler.advance()
+        self.assertEqual(len(effects), 0)
+
+    def test_renderer_draws_effects_in_one_blits_call(self):
+        from mainfile import Renderer
+        world = World(screen, Assets(headless=True))
+        for x in range(10):
+            world.explosions.append([x * 20, 100, 30])
+        renderer = Renderer(screen, world._assets)
+        renderer.draw(world)
+        self.assertEqual(renderer.queue.blits_calls, 4) # background, effects, player, HUD
+
+### Asset cache ###
+class TestAssetManager(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        os.mkdir(os.path.join(self.folder.name, "Images"))
+        image = pygame.Surface((10, 6), pygame.SRCALPHA)
+        image.fill((200, 100, 50, 128))
+        pygame.image.save(image, os.path.join(self.folder.name, "Images", "sprite.png"))
+
+    def test_resolves_any_case(self):
+        from assets import resolve_path
+        self.assertEqual(resolve_path(self.folder.name, "images", "sprite.png"), os.path.join(self.folder.name, "Images", "sprite.png"))
+
+    def test_second_load_comes_from_cache(self): # same pixels, served from the raw cache, for scaled and unscaled images
+        from assets import AssetManager
+        for size in (None, (20, 12)):
+            first = AssetManager(self.folder.name)
+            cold = first.image("images", "sprite.png", size=size, alpha=True)
+            second = AssetManager(self.folder.name)
+            warm = second.image("images", "sprite.png", size=size, alpha=True)
+            self.assertEqual((first.timings[0][2], second.timings[0][2]), ("decoded", "cache"))
+            self.assertEqual(warm.get_size(), cold.get_size())
+            self.assertEqual(pygame.image.tobytes(warm, "RGBA"), pygame.image.tobytes(cold, "RGBA"))
+        self.assertIn("total", second.report())
+
+    def test_loader_streams_critical_first(self): # worker threads load, the main thread finishes in poll()
+        from assets import AssetLoader, AssetManager, AssetRequest
+        requests = [AssetRequest(f"sprite{number}", "image", ("images", "sprite.png"), size=(number, number), alpha=True, critical=number == 3)
+                    for number in range(1, 5)]
+        ready = []
+        loader = AssetLoader(AssetManager(self.folder.name, use_cache=False), requests, lambda request, surface: ready.append((request.name, surface.get_size())))
+        self.assertEqual(loader.requests[0].name, "sprite3")
+        loader.start()
+        while not loader.critical_ready:
+            loader.wait_any()
+            loader.poll()
+        self.assertIn(("sprite3", (3, 3)), ready)
+        loader.wait("sprite4")
+        while not loader.done:
+            loader.wait_any()
+            loader.poll()
+        self.assertEqual(sorted(ready), [(f"sprite{number}", (number, number)) for number in range(1, 5)])
+        self.assertEqual(loader.progress(), (4, 4))
+
+    def test_poll_never_loses_a_request(self): # a future that finishes between done() calls is still finished exactly once
+        from assets import AssetLoader, AssetManager, AssetRequest
+        class FlippingFuture:
+            def __init__(self, not_done_calls):
+                self.not_done_calls = not_done_calls
+            def done(self):
+                self.not_done_calls -= 1
+                return self.not_done_calls < 0 # Finishes after being asked not_done_calls times
+            def result(self):
+                return "sound"
+        requests = [AssetRequest(name, "sound", ("fx", name)) for name in ("a", "b")]
+        ready = []
+        loader = AssetLoader(AssetManager(self.folder.name), requests, lambda request, value: ready.append(request.name))
+        loader._pending = [(loader.requests[0], FlippingFuture(0)), (loader.requests[1], FlippingFuture(1))]
+        self.assertEqual(loader.poll(), ["a"])
+        self.assertEqual(loader.poll(), ["b"])
+        self.assertEqual(ready, ["a", "b"])
+        self.assertTrue(loader.done)
+
+    def test_streamed_assets_match(self): # placeholders are replaced in place by the same images a blocking load gives
+        assets = Assets(headless=True, stream=True)
+        frames = assets.explosionFrames
+        self.assertIsNone(assets.endcard)
+        assets.loader.wait("endcard")
+        while not assets.loader.done:
+            assets.loader.wait_any()
+            assets.loader.poll()
+        loaded = Assets(headless=True)
+        self.assertIs(assets.explosionFrames, frames)
+        self.assertEqual(len(frames), len(loaded.explosionFrames))
+        for name in ("BG", "enemySprite", "endcard"):
+            self.assertEqual(pygame.image.tobytes(getattr(assets, name), "RGBA"), pygame.image.tobytes(getattr(loaded, name), "RGBA"))
+
+### Memory policy ###
+class TestGcPolicy(unittest.TestCase):
+    def setUp(self):
+        import gc
+        from memory import GcPolicy
+        self.gc = gc
+        self.policy = GcPolicy(thresholds=(100, 10, 10), force_factor=10)
+        self.addCleanup(self.policy.stop)
+        self.policy.start()
+
+    def make_cycles(self, count):
+        for _ in range(count):
+            cycle = []
+            cycle.append(cycle)
+
+    def test_start_freezes_and_stop_restores(self):
+        self.assertFalse(self.gc.isenabled())
+        self.assertGreater(self.gc.get_freeze_count(), 0)
+        self.policy.stop()
+        self.assertTrue(self.gc.isenabled())
+        self.assertEqual(self.gc.get_freeze_count(), 0)
+
+    def test_collects_in_idle_time(self): # a due collection runs when there is time before the deadline
+        import time
+        self.assertIsNone(self.policy.idle(time.perf_counter() + 1))
+        self.make_cycles(150)
+        self.assertEqual(self.policy.idle(time.perf_counter() + 1), 0)
+        self.assertEqual(self.policy.collections[0], 1)
+
+    def test_defers_until_forced(self): # no time left: wait, unless garbage has piled up
+        self.make_cycles(150)
+        self.assertIsNone(self.policy.idle(0))
+        self.assertEqual(self.policy.deferred, 1)
+        self.make_cycles(1000)
+        self.assertEqual(self.policy.idle(0), 0)
+        self.assertEqual(self.policy.forced, 1)
+
+    def test_forced_collections_reach_old_generations(self): # with never any time spare (--fps 0) cycles still get freed
+        import weakref
+        class Node:
+            pass
+        refs = []
+        for _ in range(250): # Every frame forced: ten young collections per gen1, ten gen1 per gen2
+            self.make_cycles(1100)
+            node = Node()
+            node.self = node
+            refs.append(weakref.ref(node))
+            del node
+            self.policy.idle(0)
+        self.assertGreater(self.policy.collections[1], 0)
+        self.assertGreater(self.policy.collections[2], 0)
+        self.assertTrue(all(ref() is None for ref in refs[:100])) # Survived young collections, freed by an old one
+
+    def test_freeze_collects_first(self): # garbage around when streaming finishes is not frozen with the assets
+        import weakref
+        class Node:
+            pass
+        node = Node()
+        node.self = node
+        ref = weakref.ref(node)
+        del node
+        self.policy.freeze()
+        self.assertIsNone(ref())
+
+class TestAllocationTracer(unittest.TestCase):
+    def test_reports_call_sites(self): # blocks kept past the end of a frame are charged to the line that made them
+        from memory import AllocationTracer
+        tracer = AllocationTracer(top=3, sample_every=1)
+        tracer.start()
+        try:
+            kept = []
+            for _ in range(2):
+                tracer.begin_frame()
+                kept.extend([index] for index in range(100))
+                tracer.end_frame()
+        finally:
+            tracer.stop()
+        site, blocks, _ = tracer.top_sites()[0]
+        self.assertTrue(site.startswith(__file__.rstrip("c")))
+        self.assertGreaterEqual(blocks, 200)
+        self.assertGreater(min(tracer.peak_bytes), 0)
+        self.assertIn("top call sites", tracer.report())
+
+### Pixel-perfect collisions ###
+class TestMaskCollisions(unittest.TestCase):
+    def setUp(self):
+        # A sprite that is only solid in its top-left quarter
+        self.corner = pygame.Surface((20, 20), pygame.SRCALPHA)
+        self.corner.fill((255, 255, 255, 255), (0, 0, 10, 10))
+
+    def test_transparent_overlap_is_no_hit(self): # rects overlap, solid pixels do not
+        from masks import MaskCache
+        masks = MaskCache()
+        enemy = Enemy(screen, self.corner, 100, 100)
+        enemies = [enemy]
+        bullets = [Projectile(screen, mock_sprite, 112, 112)]
+        score_ref = [0]
+        enemy.handle_collisions(enemies, [], bullets, mock_sprite, [], 30, pygame.mixer.Sound(buffer=b"\x00\x00"), score_ref, masks=masks)
+        self.assertEqual((score_ref[0], len(bullets)), (0, 1))
+        bullets[0]._xPos = bullets[0]._yPos = 105 # Now over the solid corner
+        enemy.handle_collisions(enemies, [], bullets, mock_sprite, [], 30, pygame.mixer.Sound(buffer=b"\x00\x00"), score_ref, masks=masks)
+        self.assertEqual((score_ref[0], len(bullets)), (1, 0))
+        self.assertEqual(masks.stats(), {"masks": 2, "tests": 2, "rejected": 1})
+
+    def test_world_builds_masks_once(self): # one mask per sprite variant, made up front
+        world = World(screen, Assets(headless=True), pixel_perfect=True)
+        built = world.masks.stats()["masks"]
+        self.assertEqual(built, 7) # Three player sprites, the enemy and three projectiles
+        for _ in range(120):
+            world.step({pygame.K_SPACE: True, pygame.K_LEFT: True})
+        self.assertEqual(world.masks.stats()["masks"], built)
+
+    def test_benchmark_compares_modes(self):
+        import benchmark
+        results = benchmark.collision_benchmark(enemies=10, bullets=100, hazards=50, repeat=1)
+        self.assertEqual(results["rects"]["mask_tests"], 0)
+        self.assertGreater(results["masks"]["mask_tests"], 0)
+        self.assertLessEqual(results["masks"]["player_hits"], results["rects"]["player_hits"])
+
+### Fixed timestep ###
+class TestFixedTimestep(unittest.TestCase):
+    def test_ticks_follow_real_time(self): # 60 Hz ticks whatever the frame rate, with the leftover as alpha
+        from timestep import FixedTimestep
+        timestep = FixedTimestep(60, max_steps=5)
+        self.assertEqual(timestep.advance(now=0.0), 0)
+        steps = [timestep.advance(now=frame / 30) for frame in range(1, 31)] # One second at 30 fps
+        self.assertEqual(sum(steps), 60)
+        self.assertEqual(timestep.advance(now=1.0 + 0.5 / 60), 0)
+        self.assertAlmostEqual(timestep.alpha, 0.5)
+
+    def test_catch_up_is_capped(self):
+        from timestep import FixedTimestep
+        timestep = FixedTimestep(60, max_steps=5)
+        timestep.advance(now=0.0)
+        self.assertEqual(timestep.advance(now=0.5), 5) # 30 ticks due after a half second stall
+        self.assertEqual(timestep.dropped_ticks, 25)
+        self.assertEqual(timestep.advance(now=0.5 + 1 / 60), 1) # Back to normal straight away
+
+    def test_drawing_between_ticks(self): # sprites are drawn part way between their last two positions
+        world = World(screen, Assets(headless=True))
+        world.interpolate = True
+        bullet = Projectile(screen, world._assets.playerBulletSprite, 100, 200)
+        world.bullets.append(bullet)
+        world.step({})
+        self.assertEqual(bullet.blit_item(0.25)[1], (100, 200 - 10 * 0.25))
+        from entity_store import EntityStore
+        store = EntityStore(world._assets.playerBulletSprite)
+        store.add_many([10.0, 20.0, 30.0], [100.0, 100.0, 100.0], 10, -1)
+        store.remember_positions()
+        store.kill(0)
+        store.update(-8, 480) # Compaction keeps old and new positions lined up
+        self.assertEqual(store.positions(0.5), [(20.0, 95.0), (30.0, 95.0)])
+
+### NumPy entity store ###
+class TestEntityStore(unittest.TestCase):
+    def setUp(self):
+        from entity_store import EntityStore
+        self.store = EntityStore(mock_sprite, capacity=2)
+
+    def test_move_cull_compact(self): # rows move by speed, leave at the top and the rest keep their order
+        self.store.add(10, 0, 10, -1)
+        self.store.add(20, 100, 10, -1)
+        self.store.add(30, 200, 10, -1)
+        self.store.update(-10, 480)
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.positions(), [(20, 90), (30, 190)])
+
+    def test_overlapping_matches_colliderect(self): # same hits as building a Rect per row
+        for x in range(0, 100, 5):
+            self.store.add(x, 50, 0, 1)
+        target = pygame.Rect(12, 55, 10, 10)
+        hits = list(self.store.overlapping(target))
+        expected = [i for i, rect in enumerate(self.store.rects()) if rect.colliderect(target)]
+        self.assertEqual(hits, expected)
+
+    def test_append_projectile(self): # Player.shoot can append Projectiles straight into a store
+        self.store.append(Projectile(screen, mock_sprite, 7, 9, direction="down"))
+        self.store.move()
+        self.assertEqual(self.store.positions(), [(7, 19)])
+
+class TestArrayWorld(unittest.TestCase):
+    def test_bullets_fired_and_culled(self): # bullets fired by the player leave the store once off screen
+        from entity_store import ArrayWorld
+        world = ArrayWorld(screen, Assets(headless=True))
+        for _ in range(200):
+            world.step({})
+        self.assertTrue(len(world.bullets) >= 1)
+        self.assertTrue(min(y for _, y in world.bullets.positions()) > -8)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,43 @@
+import time
+
+# Fixed-rate simulation clock for the game loop. Each frame advance() adds the real time since
+# the previous frame to an accumulator and returns how many fixed ticks to run, so the game
+# plays at tick_rate whatever rate it is drawn at: a slow frame is followed by extra ticks
+# rather than a slower game. alpha is how far the leftover time is into the next tick, for
+# drawing between ticks. Beyond max_steps ticks in one frame the machine cannot keep up; the
+# rest of that time is dropped (and counted) so catching up cannot snowball.
+class FixedTimestep:
+    def __init__(self, tick_rate=60, max_steps=5):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate # Seconds per tick
+        self.max_steps = max_steps
+        self.ticks = 0 # Ticks handed out so far
+        self.dropped_ticks = 0 # Ticks skipped because a frame went over max_steps
+        self._accumulator = 0.0
+        self._last = None
+
+    def advance(self, now=None):
+        # Ticks to run this frame. The first call only starts the clock
+        now = time.perf_counter() if now is None else now
+        if self._last is None:
+            self._last = now
+            return 0
+        self._accumulator += max(0.0, now - self._last)
+        self._last = now
+        steps = int(self._accumulator / self.dt + 1e-9) # Tolerate float error in sums of dt
+        self._accumulator = max(0.0, self._accumulator - steps * self.dt)
+        if steps > self.max_steps:
+            self.dropped_ticks += steps - self.max_steps
+            steps = self.max_steps
+        self.ticks += steps
+        return steps
+
+    @property
+    def alpha(self):
+        # 0-1: how far between the last tick and the next one the current time is
+        return min(1.0, self._accumulator / self.dt)
+
+    def reset(self):
+        # Forget time spent away from the loop (a long pause, a blocked window)
+        self._accumulator = 0.0
+        self._last = None